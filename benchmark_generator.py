@@ -0,0 +1,71 @@
+import argparse
+import random
+import time
+from collections import Counter, defaultdict
+
+import config
+from generator import SiteGenerator, SiteGenerationError
+
+PHASES = ("generate_corridor", "detect_spaces", "generate_room", "put_injuries", "enclose")
+
+
+def benchmark(width, height, room_num, injuries, cnt, seeds, *, retry=False):
+    """
+    Generates cnt sites with seeds drawn from seeds, a random.Random, bypassing the cache.
+    If retry, each site is generated by retrying up to config.SITE_MAX_ATTEMPT_CNT fresh seeds
+    like SiteGenerator.load_with_retry().
+    Returns the statistics as a dict.
+    """
+    failures = Counter()
+    phase_times = defaultdict(float)
+    attempt_cnt = success_cnt = 0
+    start = time.perf_counter()
+    for _ in range(cnt):
+        for _ in range(config.SITE_MAX_ATTEMPT_CNT if retry else 1):
+            attempt_cnt += 1
+            try:
+                generator = SiteGenerator(width, height, room_num, injuries, seed=seeds.getrandbits(32))
+            except SiteGenerationError as e:
+                failures[e.cause] += 1
+                for phase, seconds in e.phase_times.items():
+                    phase_times[phase] += seconds
+                if not e.is_retriable():
+                    break
+                continue
+            success_cnt += 1
+            for phase, seconds in generator.phase_times.items():
+                phase_times[phase] += seconds
+            break
+    seconds = time.perf_counter() - start
+    return {"attempts": attempt_cnt,
+            "successes": success_cnt,
+            "generations_per_second": attempt_cnt / seconds,
+            "failure_rates": {cause: failure_cnt / attempt_cnt for cause, failure_cnt in failures.items()},
+            "phase_milliseconds": {phase: phase_times[phase] / attempt_cnt * 1000 for phase in PHASES}}
+
+
+def parse_site(site):
+    """WIDTHxHEIGHT:ROOMS:INJURIES, e.g., 60x30:30:10."""
+    size, room_num, injuries = site.split(":")
+    width, height = size.split("x")
+    return int(width), int(height), int(room_num), int(injuries)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks SiteGenerator and reports why generations fail.")
+    parser.add_argument("sites", nargs="*", type=parse_site, default=[(60, 30, 30, 10), (80, 40, 60, 10),
+                                                                       (120, 60, 120, 10)],
+                        help="parameter sets as WIDTHxHEIGHT:ROOMS:INJURIES, small, medium and large by default")
+    parser.add_argument("--count", type=int, default=100, help="sites generated per parameter set")
+    parser.add_argument("--seed", type=int, default=None, help="to draw the same seeds of the sites")
+    parser.add_argument("--retry", action="store_true", help="retry failed generations with fresh seeds")
+    args = parser.parse_args()
+    for site in args.sites:
+        stats = benchmark(*site, args.count, random.Random(args.seed), retry=args.retry)
+        print(f"{site[0]}x{site[1]}, {site[2]} rooms, {site[3]} injuries: "
+              f"{stats['successes']} of {stats['attempts']} succeeded, "
+              f"{stats['generations_per_second']:.1f} generations/s")
+        for cause, rate in stats["failure_rates"].items():
+            print(f"    failed by {cause}: {rate:.2%}")
+        for phase, milliseconds in stats["phase_milliseconds"].items():
+            print(f"    {phase}: {milliseconds:.3f} ms")
@@ -0,0 +1,78 @@
+import argparse
+import random
+import sys
+import time
+
+from benchmark_generator import parse_site
+from generator import SiteGenerator, SiteGenerationError
+from robot_manager import *
+from vectorized_robot_manager import *
+
+
+def simulate(manager_type, generator, robot_type, robot_cnt, depart_from_edge, seed, max_search_action_cnt,
+             max_return_action_cnt):
+    """
+    Runs a configuration like StatisticRunner.run() after random.seed(seed).
+    Returns the reports of every 100 frames and the seconds taken.
+    """
+    random.seed(seed)
+    start = time.perf_counter()
+    layout = Layout.from_generator(generator, enable_display=False, depart_from_edge=depart_from_edge)
+    manager = manager_type(robot_type, None, layout, robot_cnt, depart_from_edge=depart_from_edge,
+                           act_after_finding_injury=False)
+    reports = []
+    while not (layout or manager.action_count >= max_search_action_cnt):
+        manager.update()
+        if manager.action_count % 100 == 0:
+            reports.append((*layout.report(), 0, *manager.report_search()))
+    reports.append((*layout.report(), 0, *manager.report_search()))
+    if robot_type != Robot and robot_type != RobotUsingGas:
+        manager.enter_gathering_mode()
+        while not (manager or manager.action_count - manager.first_injury_action_count >= max_return_action_cnt):
+            manager.update()
+            if manager.action_count % 100 == 0:
+                reports.append((*layout.report(), manager.report_gather(), *manager.report_search()))
+        reports.append((*layout.report(), manager.report_gather(), *manager.report_search()))
+    return reports, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the same configurations with RandomSpreadingRobotManager and "
+                                                 "VectorizedRobotManager, and reports where their results differ.")
+    parser.add_argument("--site", type=parse_site, default=(60, 30, 30, 10),
+                        help="parameters of the sites as WIDTHxHEIGHT:ROOMS:INJURIES")
+    parser.add_argument("--count", type=int, default=10, help="sites to run on")
+    parser.add_argument("--robots", type=int, nargs="+", default=[2, 4, 6, 8, 10], help="robot counts")
+    parser.add_argument("--seed", type=int, default=None, help="to draw the same seeds of the sites and the runs")
+    parser.add_argument("--max-search", type=int, default=1000, help="max_search_action_cnt")
+    parser.add_argument("--max-return", type=int, default=250, help="max_return_action_cnt")
+    args = parser.parse_args()
+    seeds = random.Random(args.seed)
+    run_cnt = mismatch_cnt = 0
+    seconds = {}
+    for _ in range(args.count):
+        try:
+            generator = SiteGenerator(*args.site, seed=seeds.getrandbits(32))
+        except SiteGenerationError as e:
+            print(f"Generation failed: {e}. Skipped.", file=sys.stderr)
+            continue
+        for robot_type in EnsembleRobotManager.SUPPORTED_TYPES:
+            for robot_cnt in args.robots:
+                for depart_from_edge in (False, True):
+                    seed = seeds.getrandbits(32)
+                    results = [simulate(manager_type, generator, robot_type, robot_cnt, depart_from_edge, seed,
+                                        args.max_search, args.max_return)
+                               for manager_type in (RandomSpreadingRobotManager, VectorizedRobotManager)]
+                    for manager_type, (_, run_seconds) in zip(("sprite", "vectorized"), results):
+                        seconds[robot_type.__name__, manager_type] = \
+                            seconds.get((robot_type.__name__, manager_type), 0) + run_seconds
+                    run_cnt += 1
+                    if results[0][0] != results[1][0]:
+                        mismatch_cnt += 1
+                        print(f"{robot_type.__name__} * {robot_cnt} from {'Edge' if depart_from_edge else 'Center'} "
+                              f"on site {generator.seed} with seed {seed} differs: "
+                              f"{results[0][0][-1]} != {results[1][0][-1]}")
+    print(f"{mismatch_cnt} of {run_cnt} runs differ.")
+    for (robot_type, manager_type), run_seconds in seconds.items():
+        print(f"    {robot_type} ({manager_type}): {run_seconds:.2f} s")
+    sys.exit(1 if mismatch_cnt else 0)
@@ -9,6 +9,18 @@ RESULT_DIR = "results"
 MYSQL_HOST = "localhost"
 MYSQL_USER = "root"
 MYSQL_PASSWORD = ""  # to be completed
+SQLITE_COMMIT_ROW_CNT = 1000  # buffered rows are written once there are so many of them
+SQLITE_COMMIT_INTERVAL = 10  # or the oldest of them is so many seconds old
+SQLITE_BUSY_TIMEOUT = 60  # seconds to wait for other processes to release the database
+LOG_QUEUE_SIZE = 256  # batches of rows waiting for the writer process before QueueLoggers block
+LOG_QUEUE_TIMEOUT = 300  # seconds a QueueLogger waits for a full queue before giving the writer up as dead
+SHARD_DIR = f"{RESULT_DIR}/shards"  # chunks written by ShardLogger
+COLUMN_DIR = f"{RESULT_DIR}/columns"  # merged by merge_shards.py
+SHARD_ROW_CNT = 10000  # rows per chunk
+SITE_CACHE_DIR = f"{RESULT_DIR}/sites"  # generated sites, see SiteGenerator.load()
+SITE_SEED = None  # seeds of the sites of a campaign are drawn from random.Random(SITE_SEED), so reruns hit the cache
+SITE_CACHE = None  # whether sites are saved to and loaded from SITE_CACHE_DIR, by default only if SITE_SEED is set
+SITE_MAX_ATTEMPT_CNT = 10  # seeds tried for a site before giving up, see SiteGenerator.load_with_retry()
 
 if DARK_MODE:
     FOREGROUND_COLOR = Color("white")
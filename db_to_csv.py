@@ -1,30 +1,72 @@
-import sqlite3
+import argparse
+import csv
 import os
 
-import mysql.connector
-
 import config
+from logger import AbstractLogger, LoggerType
+
+
+def connect(logger_type):
+    """Connects to the database written by SQLite3Logger or MySQLLogger."""
+    if logger_type == LoggerType.SQLite3:
+        import sqlite3
+
+        return sqlite3.connect(f"{config.RESULT_DIR}/results.db", timeout=config.SQLITE_BUSY_TIMEOUT)
+    elif logger_type == LoggerType.MySQL:
+        import mysql.connector
+
+        connection = mysql.connector.connect(
+            host=config.MYSQL_HOST,
+            user=config.MYSQL_USER,
+            password=config.MYSQL_PASSWORD,
+            database="results"
+        )
+        return connection
+    else:
+        raise Exception(f"{logger_type} is not a database!")
+
+
+def unpack_robots(blob):
+    if blob is None:
+        return ""
+    return " ".join(map(str, AbstractLogger.unpack_robots(blob).ravel().tolist()))
+
+
+def export(logger_type=LoggerType.SQLite3, filename="results", *, is_macro_model=False, batch_size=10000):
+    """
+    Streams the results table to a CSV file batch by batch, so the memory usage does not grow with the table.
+    The robots column is exported as space-separated (visits, rescues, collides) of each robot.
+    """
+    attributes = tuple(AbstractLogger.get_attributes_with_type(is_macro_model=is_macro_model))
+    robots = attributes.index("robots") if "robots" in attributes else None
+    if not os.path.exists(config.RESULT_DIR):
+        os.mkdir(config.RESULT_DIR)
+    connection = connect(logger_type)
+    try:
+        cursor = connection.cursor()  # unbuffered, i.e., rows are fetched from the server on demand
+        cursor.execute(f"SELECT {','.join(attributes)} FROM results;")
+        row_cnt = 0
+        with open(f"{config.RESULT_DIR}/{filename}.csv", "w", encoding="utf-8", newline="",
+                  buffering=1 << 20) as file:
+            writer = csv.writer(file)
+            writer.writerow(attributes)
+            while rows := cursor.fetchmany(batch_size):
+                if robots is not None:
+                    rows = [row[:robots] + (unpack_robots(row[robots]),) + row[robots + 1:] for row in rows]
+                writer.writerows(rows)
+                row_cnt += len(rows)
+        return row_cnt
+    finally:
+        connection.close()
+
 
-filename = 'results'
-if not os.path.exists(config.RESULT_DIR):
-    os.mkdir(config.RESULT_DIR)
-# connection = sqlite3.connect(f'{config.RESULT_DIR}/{filename}.db')
-connection = mysql.connector.connect(
-    host=config.MYSQL_HOST,
-    user=config.MYSQL_USER,
-    password=config.MYSQL_PASSWORD
-)
-cursor = connection.cursor()
-cursor.execute("USE results;")
-cursor.execute("SELECT * FROM results;")
-result = cursor.fetchall()
-with open(f"{config.RESULT_DIR}/{filename}.csv", "w", encoding="utf-8") as f:
-    robot_max_cnt = 10
-    # f.write("Action,JustStarted,FollowingWall,JustStartedDelta,FollowingWallDelta\n")
-    f.write("no,site_width,site_height,room_cnt,injury_cnt,departure_position,robot_type,robot_cnt,mode,room_visited,"
-            "injury_rescued,returned,total_action_cnt,"
-            f"{','.join(('robot_{}_visits,robot_{}_rescues,robot_{}_collides'.format(i, i, i) for i in range(robot_max_cnt)))}\n")
-    for row in result:
-        for col in row:
-            print(col, end=",", file=f)
-        print(file=f)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exports the results table to results/<filename>.csv.")
+    parser.add_argument("logger", nargs="?", choices=("SQLite3", "MySQL"), default="SQLite3",
+                        help="which logger has written the results")
+    parser.add_argument("--filename", default="results")
+    parser.add_argument("--macro", action="store_true", help="the results are of the macro model")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows fetched at a time")
+    args = parser.parse_args()
+    cnt = export(LoggerType[args.logger], args.filename, is_macro_model=args.macro, batch_size=args.batch_size)
+    print(f"Exported {cnt} rows to {config.RESULT_DIR}/{args.filename}.csv.")
@@ -5,15 +5,57 @@
 @File : generator.py
 @IDE  : PyCharm
 """
+import json
+import os
 import random
+import time
+from bisect import bisect_left
+from functools import lru_cache
 
 import numpy as np
 
+import config
+
+
+class SiteGenerationError(Exception):
+    """Raised when a site cannot be generated, with the cause, the phase and the seed of the failure."""
+    INJURIES_OVER_ROOM_NUM = "injuries over room number"
+    NO_SPACES = "no spaces for rooms"
+    INJURIES_NOT_PUT = "too few rooms for injuries"
+    UNEXPECTED = "unexpected"  # the original exception is chained as __cause__
+
+    def __init__(self, message, cause, *, phase=None, seed=None):
+        super().__init__(message)
+        self.cause = cause
+        self.phase = phase
+        self.seed = seed
+        self.phase_times = {}
+
+    def is_retriable(self):
+        """Whether another seed may succeed, which is not the case if the arguments are invalid."""
+        return self.cause != SiteGenerationError.INJURIES_OVER_ROOM_NUM
+
+    def __str__(self):
+        return f"{super().__str__()} ({self.cause} in {self.phase} with seed {self.seed})"
+
 
 class SiteGenerator:
-    def __init__(self, width=40, height=20, room_num=30, injuries=10, *, delete_fill=False):
-        self.site = []
-        self.site_array = np.zeros((height, width))
+    VERSION = 1  # must be increased whenever the generated sites change, which invalidates the cached ones
+    CACHED_ATTRIBUTES = ("room_cnt", "rooms", "spaces", "v_corridor", "h_corridor", "central_departure_point",
+                         "edge_departure_point")
+
+    def __init__(self, width=40, height=20, room_num=30, injuries=10, *, seed=None, delete_fill=False,
+                 generate=True):
+        """
+        The site is determined by seed and the other arguments, so only they are pickled (see __reduce__),
+        e.g., when sent to worker processes, which regenerate the site. If seed is None, one is drawn from random.
+        If not generate, site_array and grid are left None, e.g., to be loaded from the cache.
+        """
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.random = random.Random(self.seed)
+        self.is_fill_deleted = delete_fill
+        self.site_array = None
+        self.grid = None  # the site before enclose(), whose border is the walls around it
         self.v_corridor = []
         self.h_corridor = []
         self.spaces = []  # [x_min, x_max, y_min, y_max]
@@ -25,8 +67,10 @@ class SiteGenerator:
         self.room_num = room_num
         self.room_cnt = 0
         self.injuries = injuries
+        self.phase_times = {}  # seconds taken by each phase of generate()
         if self.injuries > self.room_num:
-            raise Exception("injuries overweight room number!")
+            raise SiteGenerationError("injuries overweight room number!",
+                                      SiteGenerationError.INJURIES_OVER_ROOM_NUM, phase="__init__", seed=self.seed)
 
         self.room_min_length = 5
         self.cor_min_length = 2
@@ -36,80 +80,157 @@ class SiteGenerator:
         self.inner_door_sign = "#"
         self.corridor_sign = " "
 
-        self.generate(delete_fill=delete_fill)
+        if generate:
+            # room numbers are labeled from 'A', so the grid is uint8 unless there are too many rooms
+            self.site_array = np.full((height, width), ord("%"), dtype=np.min_scalar_type(ord('A') + room_num - 1))
+            self.grid = self.site_array[1:-1, 1:-1]
+            self.generate(delete_fill=delete_fill)
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def get_cached(width, height, room_num, injuries, seed, delete_fill=False):
+        """
+        The same generator for the same arguments in this process, e.g., for the tasks of a site in a worker.
+        Never saves, so unpickling a generator does not write to config.SITE_CACHE_DIR.
+        """
+        return SiteGenerator.load(width, height, room_num, injuries, seed, delete_fill, save=False)
+
+    @staticmethod
+    def get_cache_path(width, height, room_num, injuries, seed, delete_fill=False):
+        """Without the extension, which is .npy for site_array and .json for CACHED_ATTRIBUTES."""
+        return f"{config.SITE_CACHE_DIR}/v{SiteGenerator.VERSION}_{width}x{height}_{room_num}_{injuries}_{seed}" \
+               f"{'_deleted' if delete_fill else ''}"
+
+    @staticmethod
+    def is_caching():
+        """Whether load() uses config.SITE_CACHE_DIR by default, see config.SITE_CACHE."""
+        return config.SITE_SEED is not None if config.SITE_CACHE is None else config.SITE_CACHE
+
+    @staticmethod
+    def load(width, height, room_num, injuries, seed, delete_fill=False, *, save=None):
+        """
+        Loads the site from config.SITE_CACHE_DIR, where site_array is memory-mapped,
+        or generates it, and saves it there if save, which defaults to is_caching().
+        The cache is only read if is_caching().
+        """
+        path = SiteGenerator.get_cache_path(width, height, room_num, injuries, seed, delete_fill)
+        if not SiteGenerator.is_caching() or not os.path.exists(f"{path}.json"):  # written last
+            generator = SiteGenerator(width, height, room_num, injuries, seed=seed, delete_fill=delete_fill)
+            if SiteGenerator.is_caching() if save is None else save:
+                generator.save()
+            return generator
+        generator = SiteGenerator(width, height, room_num, injuries, seed=seed, delete_fill=delete_fill,
+                                  generate=False)
+        generator.site_array = np.load(f"{path}.npy", mmap_mode="r")
+        generator.grid = generator.site_array[1:-1, 1:-1]
+        with open(f"{path}.json", encoding="utf-8") as file:
+            for attribute, value in json.load(file).items():
+                setattr(generator, attribute, value)
+        return generator
+
+    def save(self):
+        """Saves the site to config.SITE_CACHE_DIR, with site_array in the smallest dtype it fits in."""
+        path = SiteGenerator.get_cache_path(self.width, self.height, self.room_num, self.injuries, self.seed,
+                                            self.is_fill_deleted)
+        os.makedirs(config.SITE_CACHE_DIR, exist_ok=True)
+        # written to temporary files and renamed, so other processes never see a partial site
+        with open(f"{path}.npy.{os.getpid()}.tmp", "wb") as file:
+            np.save(file, self.site_array.astype(np.min_scalar_type(int(self.site_array.max()))))
+        os.replace(f"{path}.npy.{os.getpid()}.tmp", f"{path}.npy")
+        with open(f"{path}.json.{os.getpid()}.tmp", "w", encoding="utf-8") as file:
+            json.dump({attribute: getattr(self, attribute) for attribute in SiteGenerator.CACHED_ATTRIBUTES}, file)
+        os.replace(f"{path}.json.{os.getpid()}.tmp", f"{path}.json")
+
+    def __reduce__(self):
+        return SiteGenerator.get_cached, (self.width, self.height, self.room_num, self.injuries, self.seed,
+                                          self.is_fill_deleted)
+
+    @property
+    def site(self):
+        """The site as rows of characters, which is derived from site_array."""
+        return [list(map(chr, row)) for row in self.site_array.tolist()]
 
     def print(self):
-        for i in range(0, self.height):
-            for j in range(0, self.width):
-                print(self.site[i][j], end="")
-            print()
+        for row in self.site:
+            print("".join(row))
         print(f"\n{self.height} * {self.width} site generated!")
         print(f"{self.room_cnt} rooms generated! "
               f"range: [A, {chr(ord('A') + self.room_cnt - 1)}]")
         print(f"{self.injuries} injuries generated! range: [0, {self.injuries - 1}]")
 
     def delete_fill(self):
-        for i in range(1, self.height - 1):
-            for j in range(1, self.width - 1):
-                if self.site[i][j] == self.wall_sign and self.deletable(i, j):
-                    self.site[i][j] = " "
-        for room in self.rooms:
-            x_min = room[0]
-            x_max = room[1]
-            y_min = room[2]
-            y_max = room[3]
-            self.site[x_min + 1][y_min + 1] = self.wall_sign
-            self.site[x_min + 1][y_max + 1] = self.wall_sign
-            self.site[x_max + 1][y_min + 1] = self.wall_sign
-            self.site[x_max + 1][y_max + 1] = self.wall_sign
+        """Deletes the walls surrounded by walls and corridors only, except the corners of the rooms."""
+        site = self.site_array
+        deletable = np.isin(site, (ord(self.wall_sign), ord(self.corridor_sign)))
+        inner = site[1:-1, 1:-1]
+        inner[(inner == ord(self.wall_sign)) & deletable[:-2, 1:-1] & deletable[2:, 1:-1] &
+              deletable[1:-1, :-2] & deletable[1:-1, 2:]] = ord(self.corridor_sign)
+        for x_min, x_max, y_min, y_max in self.rooms:
+            site[x_min + 1, y_min + 1] = ord(self.wall_sign)
+            site[x_min + 1, y_max + 1] = ord(self.wall_sign)
+            site[x_max + 1, y_min + 1] = ord(self.wall_sign)
+            site[x_max + 1, y_max + 1] = ord(self.wall_sign)
 
     def print_original(self):
         for row in self.site:
             print("".join(row))
         print()
 
-    def deletable(self, i, j):
-        if self.site[i - 1][j] != self.wall_sign and self.site[i - 1][j] != self.corridor_sign:
-            return False
-        if self.site[i + 1][j] != self.wall_sign and self.site[i + 1][j] != self.corridor_sign:
-            return False
-        if self.site[i][j + 1] != self.wall_sign and self.site[i][j + 1] != self.corridor_sign:
-            return False
-        if self.site[i][j - 1] != self.wall_sign and self.site[i][j - 1] != self.corridor_sign:
-            return False
-        return True
-
     def generate(self, *, delete_fill=False):
-        # 创建数组
-        self.site = [[self.wall_sign for _ in range(self.width - 2)] for _ in range(self.height - 2)]
         # 生成走廊
-        self.generate_corridor()
+        self.run_phase(self.generate_corridor)
         # 检测空地
-        self.detect_spaces()
+        self.run_phase(self.detect_spaces)
         # 生成房间
-        self.generate_room()
+        self.run_phase(self.generate_room)
         # 生成伤员
-        self.put_injuries()
+        self.run_phase(self.put_injuries)
         # 封闭
-        self.enclose()
+        self.run_phase(self.enclose)
         if delete_fill:
-            self.delete_fill()
-        for i, line in enumerate(self.site):
-            for j, char in enumerate(line):
-                self.site_array[i, j] = ord(char)
+            self.run_phase(self.delete_fill)
+
+    def run_phase(self, phase):
+        """Runs phase, timing it in self.phase_times, and raises a SiteGenerationError if it fails."""
+        start = time.perf_counter()
+        try:
+            phase()
+        except SiteGenerationError as e:
+            e.phase, e.seed, e.phase_times = phase.__name__, self.seed, self.phase_times
+            raise
+        except Exception as e:
+            error = SiteGenerationError(f"{phase.__name__} failed: {e!r}", SiteGenerationError.UNEXPECTED,
+                                        phase=phase.__name__, seed=self.seed)
+            error.phase_times = self.phase_times
+            raise error from e
+        finally:
+            self.phase_times[phase.__name__] = time.perf_counter() - start
+
+    @staticmethod
+    def load_with_retry(width, height, room_num, injuries, seeds, *, delete_fill=False, failures=None,
+                        max_attempt_cnt=config.SITE_MAX_ATTEMPT_CNT):
+        """
+        Loads or generates a site by load() with seeds drawn from seeds, a random.Random, until one succeeds.
+        The SiteGenerationErrors of the failed attempts are appended to failures if it is a list.
+        Raises the last one if it is not retriable or all the max_attempt_cnt attempts fail.
+        """
+        for attempt in range(max_attempt_cnt):
+            try:
+                return SiteGenerator.load(width, height, room_num, injuries, seeds.getrandbits(32), delete_fill)
+            except SiteGenerationError as e:
+                if failures is not None:
+                    failures.append(e)
+                if not e.is_retriable() or attempt == max_attempt_cnt - 1:
+                    raise
 
     def generate_corridor(self):
         middle_cor_x_min = (self.height - 2) // 2 - 2
         middle_cor_x_max = (self.height - 2) // 2 + 1
-        for i in range(middle_cor_x_min, middle_cor_x_max + 1):
-            for j in range(self.width - 2):
-                self.site[i][j] = self.corridor_sign
+        self.grid[middle_cor_x_min:middle_cor_x_max + 1, :] = ord(self.corridor_sign)
 
         middle_cor_y_min = (self.width - 2) // 2 - 2
         middle_cor_y_max = (self.width - 2) // 2 + 1
-        for i in range(self.height - 2):
-            for j in range(middle_cor_y_min, middle_cor_y_max + 1):
-                self.site[i][j] = self.corridor_sign
+        self.grid[:, middle_cor_y_min:middle_cor_y_max + 1] = ord(self.corridor_sign)
 
         self.v_corridor.append([middle_cor_x_min, middle_cor_x_max])
         self.h_corridor.append([middle_cor_y_min, middle_cor_y_max])
@@ -118,19 +239,19 @@ class SiteGenerator:
                                         (middle_cor_y_min + middle_cor_y_max) / 2]
         self.edge_departure_point = [(2 * self.height - 9) / 2, (middle_cor_y_min + middle_cor_y_max) / 2]
 
-        v_cor_num = random.randint(int(self.height / 20), int(self.height / 10)) - 1
+        v_cor_num = self.random.randint(int(self.height / 20), int(self.height / 10)) - 1
         num = 0
         x_ranges = [[middle_cor_x_max + 1, self.height - 3], [0, middle_cor_x_min - 1]]
         while num < v_cor_num and len(x_ranges):
-            index = random.randint(0, len(x_ranges) - 1)
+            index = self.random.randint(0, len(x_ranges) - 1)
             x_range = x_ranges[index]
             x_min = x_range[0] + self.room_min_length + 1
             x_max = x_range[1] - self.room_min_length - self.cor_min_length - 1
             if x_min > x_max:
                 del x_ranges[index]
                 continue
-            x = random.randint(x_min, x_max)
-            width = random.randint(self.cor_min_length, 3)
+            x = self.random.randint(x_min, x_max)
+            width = self.random.randint(self.cor_min_length, 3)
             self.v_corridor.append([x, x + width - 1])
             new_range1 = [x_range[0], x - 1]
             new_range2 = [x + width, x_range[1]]
@@ -140,23 +261,21 @@ class SiteGenerator:
                 x_ranges.append(new_range2)
             del x_ranges[index]
             num += 1
-            for i in range(x, x + width):
-                for j in range(self.width - 2):
-                    self.site[i][j] = self.corridor_sign
+            self.grid[x:x + width, :] = ord(self.corridor_sign)
 
-        h_cor_num = random.randint(int(self.width / 20), int(self.width / 10)) - 1
+        h_cor_num = self.random.randint(int(self.width / 20), int(self.width / 10)) - 1
         num = 0
         y_ranges = [[middle_cor_y_max + 1, self.width - 3], [0, middle_cor_y_min - 1]]
         while num < h_cor_num and len(y_ranges):
-            index = random.randint(0, len(y_ranges) - 1)
+            index = self.random.randint(0, len(y_ranges) - 1)
             y_range = y_ranges[index]
             y_min = y_range[0] + self.room_min_length + 1
             y_max = y_range[1] - self.room_min_length - self.cor_min_length - 1
             if y_min > y_max:
                 del y_ranges[index]
                 continue
-            y = random.randint(y_min, y_max)
-            width = random.randint(self.cor_min_length, 3)
+            y = self.random.randint(y_min, y_max)
+            width = self.random.randint(self.cor_min_length, 3)
             self.h_corridor.append([y, y + width - 1])
             new_range1 = [y_range[0], y - 1]
             new_range2 = [y + width, y_range[1]]
@@ -166,9 +285,7 @@ class SiteGenerator:
                 y_ranges.append(new_range2)
             del y_ranges[index]
             num += 1
-            for j in range(y, y + width):
-                for i in range(self.height - 2):
-                    self.site[i][j] = self.corridor_sign
+            self.grid[:, y:y + width] = ord(self.corridor_sign)
 
         # print("corridor generated!")
         self.h_corridor = sorted(self.h_corridor, key=lambda cor: cor[0])
@@ -195,154 +312,128 @@ class SiteGenerator:
             y_max = self.h_corridor[j][0] - 1
             self.spaces.append([x_min, x_max, y_min, y_max])
         self.spaces.append([self.v_corridor[-1][1] + 1, self.height - 3, self.h_corridor[-1][1] + 1, self.width - 3])
+        if self.injuries > 0 and all(x_min > x_max or y_min > y_max for x_min, x_max, y_min, y_max in self.spaces):
+            raise SiteGenerationError("no spaces for rooms!", SiteGenerationError.NO_SPACES)
 
     def detect_edge(self, boundary):
-        x_min = boundary[0]
-        x_max = boundary[1]
-        y_min = boundary[2]
-        y_max = boundary[3]
-        up_edge = []
-        down_edge = []
-        right_edge = []
-        left_edge = []
-        for i in range(x_min, x_max + 1):
-            for j in range(y_min, y_max + 1):
-                if self.site[i][j] == self.wall_sign:
-                    if j + 1 <= self.width - 3:
-                        if self.site[i][j + 1] == self.outer_door_sign:
-                            up = 2
-                        elif self.site[i][j + 1] == self.wall_sign:
-                            up = 0
-                        else:
-                            up = 1
-                    else:
-                        up = 0
-                    if j - 1 >= 0:
-                        if self.site[i][j - 1] == self.outer_door_sign:
-                            down = 2
-                        elif self.site[i][j - 1] == self.wall_sign:
-                            down = 0
-                        else:
-                            down = 1
-                    else:
-                        down = 0
-                    if i + 1 <= self.height - 3:
-                        if self.site[i + 1][j] == self.outer_door_sign:
-                            right = 2
-                        elif self.site[i + 1][j] == self.wall_sign:
-                            right = 0
-                        else:
-                            right = 1
-                    else:
-                        right = 0
-                    if i - 1 >= 0:
-                        if self.site[i - 1][j] == self.outer_door_sign:
-                            left = 2
-                        elif self.site[i - 1][j] == self.wall_sign:
-                            left = 0
-                        else:
-                            left = 1
-                    else:
-                        left = 0
-                    if up + down + right + left == 1:
-                        if up == 1:
-                            up_edge.append([i, j])
-                        elif down == 1:
-                            down_edge.append([i, j])
-                        elif right == 1:
-                            right_edge.append([i, j])
-                        else:
-                            left_edge.append([i, j])
-        return [up_edge, down_edge, left_edge, right_edge]
+        """
+        Walls in boundary with exactly one neighbour that is neither a wall nor an outer door and walls otherwise,
+        grouped by the side of that neighbour. The walls around the site count as walls.
+        """
+        x_min, x_max, y_min, y_max = boundary
+        window = self.site_array[x_min:x_max + 3, y_min:y_max + 3]  # boundary and its neighbours in self.grid
+        kinds = (window != ord(self.wall_sign)).astype(np.int8) + (window == ord(self.outer_door_sign))
+        up = kinds[1:-1, 2:]
+        down = kinds[1:-1, :-2]
+        right = kinds[2:, 1:-1]
+        left = kinds[:-2, 1:-1]
+        is_edge = (window[1:-1, 1:-1] == ord(self.wall_sign)) & (up + down + right + left == 1)
+        return [(np.argwhere(is_edge & (side == 1)) + (x_min, y_min)).tolist() for side in (up, down, left, right)]
 
     def generate_room(self):
+        """
+        The edges of each space are detected once and kept sorted without the blacklisted ones,
+        and only those around the new rooms are redetected by update_edges() when the space is chosen again.
+        """
         num = 0
-        black_lists = [[] for _ in range(len(self.spaces))]
+        black_lists = [set() for _ in range(len(self.spaces))]
+        space_edges = [None for _ in range(len(self.spaces))]  # [up, down, left, right] edges of each space
+        new_rooms = [[] for _ in range(len(self.spaces))]
         while num < self.room_num:
             number = chr(num + ord('A'))
             if not self.spaces:
                 break
-            i = random.randint(0, len(self.spaces) - 1)
+            i = self.random.randint(0, len(self.spaces) - 1)
             space = self.spaces[i]
             black_list = black_lists[i]
-            edges = self.detect_edge(space)
-            up_edge = edges[0]
-            down_edge = edges[1]
-            left_edge = edges[2]
-            right_edge = edges[3]
-            all_edges = up_edge + down_edge + left_edge + right_edge
-            for edge in black_list:
-                if edge in all_edges:
-                    all_edges.remove(edge)
-            if not all_edges:
+            if space_edges[i] is None:
+                space_edges[i] = [list(map(tuple, edges)) for edges in self.detect_edge(space)]  # already sorted
+            for room in new_rooms[i]:
+                self.update_edges(space, space_edges[i], black_list, room)
+            new_rooms[i].clear()
+            edge_cnt = sum(map(len, space_edges[i]))
+            if edge_cnt == 0:
                 del self.spaces[i]
                 del black_lists[i]
+                del space_edges[i]
+                del new_rooms[i]
                 continue
-            door = all_edges[random.randint(0, len(all_edges) - 1)]
+            index = self.random.randint(0, edge_cnt - 1)  # of up_edge + down_edge + left_edge + right_edge
+            for edge_type, edges in enumerate(space_edges[i]):
+                if index < len(edges):
+                    break
+                index -= len(edges)
+            door = edges[index]
             door_x = door[0]
             door_y = door[1]
             outer_door = door_x == space[0] or door_x == space[1] or door_y == space[2] or door_y == space[3]
-            if door in down_edge:
-                if not self.generate_upside_room(space, door, number, outer_door):
-                    black_lists[i].append(door)
-                else:
-                    num += 1
-            elif door in up_edge:
-                if not self.generate_downside_room(space, door, number, outer_door):
-                    black_lists[i].append(door)
-                else:
-                    num += 1
-            elif door in right_edge:
-                if not self.generate_leftside_room(space, door, number, outer_door):
-                    black_lists[i].append(door)
-                else:
-                    num += 1
+            if edge_type == 1:  # down_edge
+                generated = self.generate_upside_room(space, door, number, outer_door)
+            elif edge_type == 0:  # up_edge
+                generated = self.generate_downside_room(space, door, number, outer_door)
+            elif edge_type == 3:  # right_edge
+                generated = self.generate_leftside_room(space, door, number, outer_door)
             else:
-                if not self.generate_rightside_room(space, door, number, outer_door):
-                    black_lists[i].append(door)
-                else:
-                    num += 1
+                generated = self.generate_rightside_room(space, door, number, outer_door)
+            if generated:
+                num += 1
+                new_rooms[i].append(self.rooms[-1])
+            else:
+                black_list.add(door)
+                del edges[index]
         self.room_cnt = num
 
+    def update_edges(self, space, edges, black_list, room):
+        """
+        Redetects the edges of space around room, because only its cells have been changed.
+        Other spaces are not affected, because they are separated from space by corridors.
+        """
+        window = [max(room[0] - 1, space[0]), min(room[1] + 1, space[1]),
+                  max(room[2] - 1, space[2]), min(room[3] + 1, space[3])]
+        for edge_type, detected in zip(edges, self.detect_edge(window)):
+            # edges are sorted by x first, so those of the rows of window are a slice
+            start = bisect_left(edge_type, (window[0],))
+            end = bisect_left(edge_type, (window[1] + 1,))
+            edge_type[start:end] = sorted(
+                [edge for edge in edge_type[start:end] if not window[2] <= edge[1] <= window[3]] +
+                [edge for edge in map(tuple, detected) if edge not in black_list])
+
+    def scan(self, cells, start):
+        """
+        Index of the first cell that is not a wall in cells, which are scanned from start,
+        or of the last cell if all of them are walls.
+        """
+        is_wall = cells == ord(self.wall_sign)
+        return start + (len(cells) - 1 if is_wall.all() else int(is_wall.argmin()))
+
     def generate_upside_room(self, boundary: list, door: list, number, outer_door: bool):
         door_x = door[0]
         door_y = door[1]
-        y = door_y + 1
-        for y in range(door_y + 1, self.width - 2):
-            if self.site[door_x][y] != self.wall_sign:
-                break
-        max_width = y - door_y - 2
+        scan = lambda x: self.scan(self.grid[x, door_y + 1:], door_y + 1)
+        max_width = scan(door_x) - door_y - 2
         if max_width <= 0:
             return False
         x_min = door_x
         x_max = door_x
-        while x_min >= boundary[0] and self.site[x_min][door_y] == self.wall_sign:
-            for y in range(door_y + 1, self.width - 2):
-                if self.site[x_min][y] != self.wall_sign:
-                    break
-            if y - door_y - 2 < max_width:
+        while x_min >= boundary[0] and self.grid[x_min, door_y] == ord(self.wall_sign):
+            if scan(x_min) - door_y - 2 < max_width:
                 break
             x_min -= 1
         x_min += 1
-        while x_max <= boundary[1] and self.site[x_max][door_y] == self.wall_sign:
-            for y in range(door_y + 1, self.width - 2):
-                if self.site[x_max][y] != self.wall_sign:
-                    break
-            if y - door_y - 2 < max_width:
+        while x_max <= boundary[1] and self.grid[x_max, door_y] == ord(self.wall_sign):
+            if scan(x_max) - door_y - 2 < max_width:
                 break
             x_max += 1
         x_max -= 1
         if x_max == door_x or x_min == door_x:
             return False
-        room_x_min = random.randint(x_min, door_x - 1)
-        room_x_max = random.randint(door_x + 1, x_max)
-        room_y_max = random.randint(door_y + 2, door_y + max_width + 1)
+        room_x_min = self.random.randint(x_min, door_x - 1)
+        room_x_max = self.random.randint(door_x + 1, x_max)
+        room_y_max = self.random.randint(door_y + 2, door_y + max_width + 1)
 
         # print
-        self.site[door_x][door_y] = self.outer_door_sign if outer_door else self.inner_door_sign
-        for i in range(room_x_min + 1, room_x_max):
-            for j in range(door_y + 1, room_y_max):
-                self.site[i][j] = number
+        self.grid[door_x, door_y] = ord(self.outer_door_sign if outer_door else self.inner_door_sign)
+        self.grid[room_x_min + 1:room_x_max, door_y + 1:room_y_max] = ord(number)
         # add
         self.rooms.append([room_x_min, room_x_max, door_y, room_y_max])
         return True
@@ -350,42 +441,32 @@ class SiteGenerator:
     def generate_downside_room(self, boundary: list, door: list, number, outer_door: bool):
         door_x = door[0]
         door_y = door[1]
-        y = door_y - 1
-        for y in range(door_y - 1, -1, -1):
-            if self.site[door_x][y] != self.wall_sign:
-                break
-        max_width = door_y - y - 2
+        scan = lambda x: 2 * door_y - self.scan(self.grid[x, door_y - 1::-1] if door_y else self.grid[x, :0],
+                                                door_y + 1)
+        max_width = door_y - scan(door_x) - 2
         if max_width <= 0:
             return False
         x_min = door_x
         x_max = door_x
-        while x_min >= boundary[0] and self.site[x_min][door_y] == self.wall_sign:
-            for y in range(door_y - 1, -1, -1):
-                if self.site[x_min][y] != self.wall_sign:
-                    break
-            if door_y - y - 2 < max_width:
+        while x_min >= boundary[0] and self.grid[x_min, door_y] == ord(self.wall_sign):
+            if door_y - scan(x_min) - 2 < max_width:
                 break
             x_min -= 1
         x_min += 1
-        while x_max <= boundary[1] and self.site[x_max][door_y] == self.wall_sign:
-            for y in range(door_y - 1, -1, -1):
-                if self.site[x_max][y] != self.wall_sign:
-                    break
-            if door_y - y - 2 < max_width:
+        while x_max <= boundary[1] and self.grid[x_max, door_y] == ord(self.wall_sign):
+            if door_y - scan(x_max) - 2 < max_width:
                 break
             x_max += 1
         x_max -= 1
         if x_max == door_x or x_min == door_x:
             return False
-        room_x_min = random.randint(x_min, door_x - 1)
-        room_x_max = random.randint(door_x + 1, x_max)
-        room_y_min = random.randint(door_y - max_width - 1, door_y - 2)
+        room_x_min = self.random.randint(x_min, door_x - 1)
+        room_x_max = self.random.randint(door_x + 1, x_max)
+        room_y_min = self.random.randint(door_y - max_width - 1, door_y - 2)
 
         # print
-        self.site[door_x][door_y] = self.outer_door_sign if outer_door else self.inner_door_sign
-        for i in range(room_x_min + 1, room_x_max):
-            for j in range(door_y - 1, room_y_min, -1):
-                self.site[i][j] = number
+        self.grid[door_x, door_y] = ord(self.outer_door_sign if outer_door else self.inner_door_sign)
+        self.grid[room_x_min + 1:room_x_max, room_y_min + 1:door_y] = ord(number)
         # add
         self.rooms.append([room_x_min, room_x_max, room_y_min, door_y])
         return True
@@ -393,42 +474,31 @@ class SiteGenerator:
     def generate_rightside_room(self, boundary: list, door: list, number, outer_door: bool):
         door_x = door[0]
         door_y = door[1]
-        x = door_x + 1
-        for x in range(door_x + 1, self.height - 2):
-            if self.site[x][door_y] != self.wall_sign:
-                break
-        max_length = x - door_x - 2
+        scan = lambda y: self.scan(self.grid[door_x + 1:, y], door_x + 1)
+        max_length = scan(door_y) - door_x - 2
         if max_length <= 0:
             return False
         y_min = door_y
         y_max = door_y
-        while y_min >= boundary[2] and self.site[door_x][y_min] == self.wall_sign:
-            for x in range(door_x + 1, self.height - 2):
-                if self.site[x][y_min] != self.wall_sign:
-                    break
-            if x - door_x - 2 < max_length:
+        while y_min >= boundary[2] and self.grid[door_x, y_min] == ord(self.wall_sign):
+            if scan(y_min) - door_x - 2 < max_length:
                 break
             y_min -= 1
         y_min += 1
-        while y_max <= boundary[3] and self.site[door_x][y_max] == self.wall_sign:
-            for x in range(door_x + 1, self.height - 2):
-                if self.site[x][y_max] != self.wall_sign:
-                    break
-            if x - door_x - 2 < max_length:
+        while y_max <= boundary[3] and self.grid[door_x, y_max] == ord(self.wall_sign):
+            if scan(y_max) - door_x - 2 < max_length:
                 break
             y_max += 1
         y_max -= 1
         if y_max == door_y or y_min == door_y:
             return False
-        room_y_min = random.randint(y_min, door_y - 1)
-        room_y_max = random.randint(door_y + 1, y_max)
-        room_x_max = random.randint(door_x + 2, door_x + max_length + 1)
+        room_y_min = self.random.randint(y_min, door_y - 1)
+        room_y_max = self.random.randint(door_y + 1, y_max)
+        room_x_max = self.random.randint(door_x + 2, door_x + max_length + 1)
 
         # print
-        self.site[door_x][door_y] = self.outer_door_sign if outer_door else self.inner_door_sign
-        for i in range(door_x + 1, room_x_max):
-            for j in range(room_y_min + 1, room_y_max):
-                self.site[i][j] = number
+        self.grid[door_x, door_y] = ord(self.outer_door_sign if outer_door else self.inner_door_sign)
+        self.grid[door_x + 1:room_x_max, room_y_min + 1:room_y_max] = ord(number)
         # add
         self.rooms.append([door_x, room_x_max, room_y_min, room_y_max])
         return True
@@ -436,65 +506,51 @@ class SiteGenerator:
     def generate_leftside_room(self, boundary: list, door: list, number, outer_door: bool):
         door_x = door[0]
         door_y = door[1]
-        x = door_x - 1
-        for x in range(door_x - 1, -1, -1):
-            if self.site[x][door_y] != self.wall_sign:
-                break
-        max_length = door_x - x - 2
+        scan = lambda y: 2 * door_x - self.scan(self.grid[door_x - 1::-1, y] if door_x else self.grid[:0, y],
+                                                door_x + 1)
+        max_length = door_x - scan(door_y) - 2
         if max_length <= 0:
             return False
         y_min = door_y
         y_max = door_y
-        while y_min >= boundary[2] and self.site[door_x][y_min] == self.wall_sign:
-            for x in range(door_x - 1, -1, -1):
-                if self.site[x][y_min] != self.wall_sign:
-                    break
-            if door_x - x - 2 < max_length:
+        while y_min >= boundary[2] and self.grid[door_x, y_min] == ord(self.wall_sign):
+            if door_x - scan(y_min) - 2 < max_length:
                 break
             y_min -= 1
         y_min += 1
-        while y_max <= boundary[3] and self.site[door_x][y_max] == self.wall_sign:
-            for x in range(door_x - 1, -1, -1):
-                if self.site[x][y_max] != self.wall_sign:
-                    break
-            if door_x - x - 2 < max_length:
+        while y_max <= boundary[3] and self.grid[door_x, y_max] == ord(self.wall_sign):
+            if door_x - scan(y_max) - 2 < max_length:
                 break
             y_max += 1
         y_max -= 1
         if y_max == door_y or y_min == door_y:
             return False
-        room_y_min = random.randint(y_min, door_y - 1)
-        room_y_max = random.randint(door_y + 1, y_max)
-        room_x_min = random.randint(door_x - max_length - 1, door_x - 2)
+        room_y_min = self.random.randint(y_min, door_y - 1)
+        room_y_max = self.random.randint(door_y + 1, y_max)
+        room_x_min = self.random.randint(door_x - max_length - 1, door_x - 2)
 
         # print
-        self.site[door_x][door_y] = self.outer_door_sign if outer_door else self.inner_door_sign
-        for i in range(door_x - 1, room_x_min, -1):
-            for j in range(room_y_min + 1, room_y_max):
-                self.site[i][j] = number
+        self.grid[door_x, door_y] = ord(self.outer_door_sign if outer_door else self.inner_door_sign)
+        self.grid[room_x_min + 1:door_x, room_y_min + 1:room_y_max] = ord(number)
         # add
         self.rooms.append([room_x_min, door_x, room_y_min, room_y_max])
         return True
 
     def put_injuries(self):
+        """The rooms chosen for the injuries are relabeled at once by a lookup table."""
         room_numbers = list(range(ord('A'), ord('A') + self.room_cnt))
+        labels = np.arange(np.iinfo(self.grid.dtype).max + 1, dtype=self.grid.dtype)
         for i in range(self.injuries):
             if not room_numbers:
-                raise Exception("injuries put failed!\ninjuries overweight room number!")
-            index = random.randint(0, len(room_numbers) - 1)
-            room_number = room_numbers[index]
-            for x in range(0, len(self.site)):
-                for y in range(0, len(self.site[x])):
-                    if self.site[x][y] == chr(room_number):
-                        self.site[x][y] = str(i)
+                raise SiteGenerationError(f"injuries put failed! only {self.room_cnt} rooms for {self.injuries}",
+                                          SiteGenerationError.INJURIES_NOT_PUT)
+            index = self.random.randint(0, len(room_numbers) - 1)
+            labels[room_numbers[index]] = ord('0') + i
             del room_numbers[index]
+        self.grid[:] = labels[self.grid]
 
     def enclose(self):
-        for item in self.site:
-            item.insert(0, self.wall_sign)
-            item.append(self.wall_sign)
-        self.site.insert(0, [self.wall_sign for _ in range(self.width)])
-        self.site.append([self.wall_sign for _ in range(self.width)])
+        """self.grid is a view of the inside of self.site_array, whose border is already walls."""
         self.central_departure_point = [pos + 1 for pos in self.central_departure_point]
         self.edge_departure_point = [pos + 1 for pos in self.edge_departure_point]
 
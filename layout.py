@@ -5,6 +5,7 @@ import pygame
 from pygame.locals import *
 
 import config
+import utils
 from generator import SiteGenerator
 from utils import Direction
 
@@ -22,14 +23,13 @@ class Layout:
         size = int((col_cnt - 1) * Wall.SPAN_UNIT), int((row_cnt - 1) * Wall.SPAN_UNIT)
         if enable_display:
             self.display = pygame.display.set_mode(size)
-        else:
-            self.display = None
-        self.layout = pygame.Surface(size)
-        if self.display is None:
-            self.rect = self.layout.get_rect()
-        else:
-            self.rect = self.display.get_rect()
+            self.layout = pygame.Surface(size)
             self.layout.fill(config.BACKGROUND_COLOR)
+            self.rect = self.display.get_rect()
+        else:  # headless: geometry only, nothing is ever drawn
+            self.display = None
+            self.layout = None
+            self.rect = pygame.Rect((0, 0), size)
         if departure_position is None:
             self.departure_position = self.rect.center
         else:
@@ -38,44 +38,35 @@ class Layout:
         self.doors = pygame.sprite.Group()
         self.rooms = pygame.sprite.Group()
         self.injuries = pygame.sprite.Group()
-        self.visited_places = pygame.sprite.Group()
+        self.visited_room_cnt = 0  # maintained by RoomArea.update()
+        self.rescued_injury_cnt = 0  # maintained by InjuryArea.update()
+        self.visited_places = VisitedPlaces()
         self.departure_place = DeparturePlace(*self.departure_position, self)
 
-        for i in range(row_cnt):
-            wall_start = 0
-            wall_started = False
-            for j in range(col_cnt):
-                if site[i, j] == ord("/"):
-                    self.doors.add(Door(i, j, self))
-                if site[i, j] == ord("%"):
-                    if not wall_started and j + 1 != col_cnt:
-                        wall_started = True
-                else:
-                    if wall_started and wall_start < j - 1:
-                        self.walls.add(Wall(i, wall_start, i, j - 1, Direction.HORIZONTAL, self))
-                    wall_started = False
-                    wall_start = j + 1
-            if wall_started and wall_start < col_cnt:
-                self.walls.add(Wall(i, wall_start, i, col_cnt - 1, Direction.HORIZONTAL, self))
-
-        for j in range(col_cnt):
-            wall_start = 0
-            wall_started = False
-            for i in range(row_cnt):
-                if site[i, j] == ord("%"):
-                    if not wall_started and i + 1 != row_cnt:
-                        wall_started = True
-                else:
-                    if wall_started and wall_start < i - 1:
-                        self.walls.add(Wall(wall_start, j, i - 1, j, Direction.VERTICAL, self))
-                    wall_started = False
-                    wall_start = i + 1
-            if wall_started and wall_start < row_cnt:
-                self.walls.add(Wall(wall_start, j, row_cnt - 1, j, Direction.VERTICAL, self))
+        self.doors.add(*(Door(i, j, self) for i, j in np.argwhere(site == ord("/")).tolist()))
+        is_wall = site == ord("%")
+        self.walls.add(*(Wall(i, start, i, end, Direction.HORIZONTAL, self)
+                         for i, start, end in Layout.get_wall_runs(is_wall)))
+        self.walls.add(*(Wall(start, j, end, j, Direction.VERTICAL, self)
+                         for j, start, end in Layout.get_wall_runs(is_wall.T)))
+        self.wall_grid = SpriteGrid(self.walls, Wall.SPAN_UNIT)
+        for wall in self.walls:  # walls never change, so neither do their neighbours
+            wall.adjacent_walls = frozenset(self.wall_grid.collide(wall.rect))
+        self.door_positions = None
+        self.door_candidates = {}  # of the cells looked up so far, see get_door_candidates()
+
+        # Room ids (> 0) and negated injury ids (< 0) of each cell, 0 for cells outside any area.
+        self.area_raster = np.zeros((row_cnt - 1, col_cnt - 1), dtype=np.int16)
+        self.room_list = []
+        self.injury_list = []
 
         if rooms is not None:
             for i, room in enumerate(rooms):
-                self.rooms.add(RoomArea(i + 1, *room, self))  # assert len(room) == 4
+                room_area = RoomArea(i + 1, *room, self)  # assert len(room) == 4
+                self.rooms.add(room_area)
+                self.room_list.append(room_area)
+                x1, y1, x2, y2 = room
+                self.area_raster[y1:y2, x1:x2] = room_area.id
 
         if injuries is not None:
             if self.display is not None:
@@ -91,11 +82,15 @@ class Layout:
                 for img in InjuryArea.AVAILABLE_IMAGES:
                     img.set_colorkey(pygame.Color("black"), RLEACCEL)
             for i, injury in enumerate(injuries):
-                self.injuries.add(InjuryArea(i + 1, *injury, self))
+                injury_area = InjuryArea(i + 1, *injury, self)
+                self.injuries.add(injury_area)
+                self.injury_list.append(injury_area)
+                x1, y1, x2, y2 = injury
+                self.area_raster[y1:y2, x1:x2] = -injury_area.id
 
     def __bool__(self):
         """all(self.rooms) and all(self.injuries) are visited and rescued."""
-        return all(self.rooms) and all(self.injuries)
+        return self.visited_room_cnt == len(self.rooms) and self.rescued_injury_cnt == len(self.injuries)
 
     @staticmethod
     def from_file(filename, *, enable_display=True):
@@ -115,6 +110,17 @@ class Layout:
                     departure_position = int(j * Wall.SPAN_UNIT), int(i * Wall.SPAN_UNIT)
         return Layout(site, enable_display=enable_display, departure_position=departure_position)
 
+    @staticmethod
+    def get_wall_runs(is_wall: np.ndarray):
+        """(row, start, end) of the runs of at least 2 walls in each row of is_wall, in row-major order."""
+        padded = np.zeros((is_wall.shape[0], is_wall.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = is_wall
+        changes = np.diff(padded, axis=1)
+        starts = np.argwhere(changes == 1)  # (row, first column) of each run
+        ends = np.argwhere(changes == -1)[:, 1]  # one past the last column of each run in the same order
+        is_long = ends - starts[:, 1] >= 2
+        return np.column_stack((starts[is_long], ends[is_long] - 1)).tolist()
+
     @staticmethod
     def from_generator(gen: SiteGenerator, *, enable_display=True, depart_from_edge=False):
         """
@@ -143,23 +149,124 @@ class Layout:
         assert self.display is not None, "If no display is initialized, no need to update layout."
         self.display.blit(self.layout, self.rect)
 
+    def get_entered_areas(self, rect: pygame.Rect):
+        """Returns the rooms and the injuries colliding with rect, looked up in self.area_raster."""
+        rows, cols = self.area_raster.shape
+        x1 = max(int(rect.left // Wall.SPAN_UNIT), 0)
+        y1 = max(int(rect.top // Wall.SPAN_UNIT), 0)
+        x2 = min(int((rect.right - 1) // Wall.SPAN_UNIT), cols - 1)
+        y2 = min(int((rect.bottom - 1) // Wall.SPAN_UNIT), rows - 1)
+        entered_rooms = []
+        entered_injuries = []
+        if x1 > x2 or y1 > y2:
+            return entered_rooms, entered_injuries
+        area_ids = set(self.area_raster[y1:y2 + 1, x1:x2 + 1].ravel().tolist())
+        area_ids.discard(0)
+        for area_id in sorted(area_ids, key=abs):  # in group order
+            if area_id > 0:
+                room = self.room_list[area_id - 1]
+                if rect.colliderect(room.rect):
+                    entered_rooms.append(room)
+            elif area_id < 0:
+                injury = self.injury_list[-area_id - 1]
+                if rect.colliderect(injury.rect):
+                    entered_injuries.append(injury)
+        return entered_rooms, entered_injuries
+
+    def get_door_candidates(self, row, col):
+        """
+        Doors that may be the nearest one to some point of the cell of Wall.SPAN_UNIT at (row, col), in group order.
+        A door is a candidate if its minimum distance to the cell is not greater than
+        the smallest maximum distance of any door to the cell.
+        The candidates of a cell are only built when it is first looked up, in O(len(self.doors)) memory.
+        """
+        candidates = self.door_candidates.get((row, col))
+        if candidates is not None:
+            return candidates
+        doors = self.doors.sprites()
+        if self.door_positions is None:
+            self.door_positions = np.array([door.position for door in doors], dtype=np.float64).reshape(-1, 2)
+        px, py = self.door_positions.T
+        x1 = col * Wall.SPAN_UNIT
+        y1 = row * Wall.SPAN_UNIT
+        x2 = x1 + Wall.SPAN_UNIT
+        y2 = y1 + Wall.SPAN_UNIT
+        min_dx2 = np.maximum(np.maximum(x1 - px, px - x2), 0) ** 2
+        min_dy2 = np.maximum(np.maximum(y1 - py, py - y2), 0) ** 2
+        max_dx2 = np.maximum(np.abs(px - x1), np.abs(px - x2)) ** 2
+        max_dy2 = np.maximum(np.abs(py - y1), np.abs(py - y2)) ** 2
+        bound = (max_dy2 + max_dx2).min(initial=np.inf)
+        is_candidate = min_dy2 + min_dx2 <= bound + 1  # with some slack for rounding
+        candidates = self.door_candidates[row, col] = tuple(doors[k] for k in np.flatnonzero(is_candidate))
+        return candidates
+
+    def get_nearest_door(self, position):
+        """Same as min(self.doors) by distance to position, but only among the candidates of the cell of position."""
+        rows, cols = self.area_raster.shape
+        col = min(max(int(position[0] // Wall.SPAN_UNIT), 0), cols - 1)
+        row = min(max(int(position[1] // Wall.SPAN_UNIT), 0), rows - 1)
+        return min(self.get_door_candidates(row, col),
+                   key=lambda d: utils.pygame_cartesian_diff_vec(position, d.position).length())
+
     def count_rescued_injuries(self):
-        cnt = 0
-        for injury in self.injuries:
-            if injury.rescued:  # OK
-                cnt += 1
-        return cnt
+        return self.rescued_injury_cnt
 
     def count_visited_rooms_exclude_injuries(self):
-        cnt = 0
-        for room in self.rooms:
-            if room.visited:  # OK
-                cnt += 1
-        return cnt
+        return self.visited_room_cnt
 
     def report(self):
-        rescued_cnt = self.count_rescued_injuries()
-        return self.count_visited_rooms_exclude_injuries() + rescued_cnt, rescued_cnt
+        return self.visited_room_cnt + self.rescued_injury_cnt, self.rescued_injury_cnt
+
+
+class SpriteGrid:
+    """
+    Uniform grid over static sprites, bucketed by the cells their rects overlap.
+    Queries only test the sprites near the given rect and keep the order of the original group.
+    """
+
+    def __init__(self, sprites, cell_size):
+        self.cell_size = int(cell_size)
+        self.sprites = list(sprites)
+        self.cells = {}
+        for index, sprite in enumerate(self.sprites):
+            for cell in self.get_cells(sprite.rect):
+                self.cells.setdefault(cell, []).append(index)
+
+    def get_cells(self, rect: pygame.Rect):
+        x1 = rect.left // self.cell_size
+        y1 = rect.top // self.cell_size
+        x2 = max(rect.left, rect.right - 1) // self.cell_size
+        y2 = max(rect.top, rect.bottom - 1) // self.cell_size
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                yield x, y
+
+    def get_candidates(self, rect: pygame.Rect):
+        candidates = set()
+        for cell in self.get_cells(rect):
+            candidates.update(self.cells.get(cell, ()))
+        return candidates
+
+    def collide_any(self, rect: pygame.Rect):
+        """Like pygame.sprite.spritecollideany(), returns the first colliding sprite or None."""
+        found = None
+        for index in self.get_candidates(rect):
+            if (found is None or index < found) and rect.colliderect(self.sprites[index].rect):
+                found = index
+        return None if found is None else self.sprites[found]
+
+    def collide(self, rect: pygame.Rect):
+        """Like pygame.sprite.spritecollide(), returns all colliding sprites in order."""
+        return [self.sprites[index] for index in sorted(self.get_candidates(rect))
+                if rect.colliderect(self.sprites[index].rect)]
+
+
+def get_circle_rect(center, radius, bounds: pygame.Rect):
+    """Same bounding rect as pygame.draw.circle() returns, including clipping to the bounds."""
+    rect = pygame.Rect(center[0] - radius, center[1] - radius, 2 * radius, 2 * radius).clip(bounds)
+    if rect.size == (0, 0):
+        return pygame.Rect(center, (0, 0))
+    return rect
 
 
 class Wall(pygame.sprite.Sprite):
@@ -176,8 +283,21 @@ class Wall(pygame.sprite.Sprite):
         self.x2 = int(x2 * Wall.SPAN_UNIT)
         self.y2 = int(y2 * Wall.SPAN_UNIT)
         self.direction = direction
-        self.rect = pygame.draw.line(background.layout,
-                                     config.FOREGROUND_COLOR, (self.y1, self.x1), (self.y2, self.x2), Wall.WIDTH)
+        self.adjacent_walls = frozenset()  # colliding walls including self, set by the layout
+        # Same bounding rect as pygame.draw.line() returns, including clipping to the layout.
+        half_width = (Wall.WIDTH - 1) // 2
+        if direction == Direction.HORIZONTAL:
+            rect = pygame.Rect(self.y1, self.x1 - half_width, self.y2 - self.y1 + 1, Wall.WIDTH)
+        else:
+            rect = pygame.Rect(self.y1 - half_width, self.x1, Wall.WIDTH, self.x2 - self.x1 + 1)
+        self.rect = rect.clip(background.rect)
+        if self.rect.size == (0, 0):
+            self.rect = pygame.Rect(self.y1, self.x1, 0, 0)
+        if background.layout is not None:
+            self.draw(background.layout)
+
+    def draw(self, surface: pygame.Surface):
+        pygame.draw.line(surface, config.FOREGROUND_COLOR, (self.y1, self.x1), (self.y2, self.x2), Wall.WIDTH)
 
     def __hash__(self):
         return hash((self.x1, self.y1, self.x2, self.y2))
@@ -195,10 +315,16 @@ class Wall(pygame.sprite.Sprite):
 class DeparturePlace(pygame.sprite.Sprite):
     def __init__(self, x, y, background: Layout):
         super().__init__()
-        self.rect = pygame.draw.circle(background.layout, config.BACKGROUND_COLOR,  # pygame.Color("green"),
-                                       (x, y), Wall.HALF_SPAN_UNIT)
+        self.center = x, y
+        self.rect = get_circle_rect(self.center, Wall.HALF_SPAN_UNIT, background.rect)
         self.radius = Wall.HALF_SPAN_UNIT
         self.position = self.rect.center
+        if background.layout is not None:
+            self.draw(background.layout)
+
+    def draw(self, surface: pygame.Surface):
+        pygame.draw.circle(surface, config.BACKGROUND_COLOR,  # pygame.Color("green"),
+                           self.center, Wall.HALF_SPAN_UNIT)
 
     def __hash__(self):
         return hash(self.position)
@@ -216,9 +342,15 @@ class DeparturePlace(pygame.sprite.Sprite):
 class Door(pygame.sprite.Sprite):
     def __init__(self, x, y, background: Layout):
         super().__init__()
-        self.rect = pygame.draw.circle(background.layout, config.BACKGROUND_COLOR,  # pygame.Color("red"),
-                                       (int(y * Wall.SPAN_UNIT), int(x * Wall.SPAN_UNIT)), Wall.HALF_SPAN_UNIT)
+        self.center = int(y * Wall.SPAN_UNIT), int(x * Wall.SPAN_UNIT)
+        self.rect = get_circle_rect(self.center, Wall.HALF_SPAN_UNIT, background.rect)
         self.position = self.rect.center
+        if background.layout is not None:
+            self.draw(background.layout)
+
+    def draw(self, surface: pygame.Surface):
+        pygame.draw.circle(surface, config.BACKGROUND_COLOR,  # pygame.Color("red"),
+                           self.center, Wall.HALF_SPAN_UNIT)
 
     def __hash__(self):
         return hash(self.position)
@@ -233,10 +365,64 @@ class Door(pygame.sprite.Sprite):
         return f"Door({self.position})"
 
 
+class VisitedPlaces:
+    """
+    Gas trail hashed by quantized position, behaving like a pygame.sprite.Group of VisitedPlace
+    searched by pygame.sprite.spritecollideany() with pygame.sprite.collide_circle().
+    A position is marked once however many times it is passed.
+    """
+
+    def __init__(self, cell_size=None):
+        self.cell_size = VisitedPlace.CELL_SIZE if cell_size is None else cell_size
+        self.places = {}  # position -> place, in marking order
+        self.cells = {}  # cell -> places in marking order
+
+    def get_cell(self, position):
+        return int(position[0]) // self.cell_size, int(position[1]) // self.cell_size
+
+    def add(self, robot):
+        """Marks the place the robot has just left, i.e., robot.old_rect.center."""
+        position = robot.old_rect.center
+        if position not in self.places:
+            place = VisitedPlace(robot)
+            place.order = len(self.places)
+            self.places[position] = place
+            self.cells.setdefault(self.get_cell(position), []).append(place)
+
+    def find(self, robot):
+        """
+        Returns the earliest marked place colliding with a place at robot.old_rect.center, or None.
+        Only the cells within reach of the colliding distance are searched.
+        """
+        x, y = robot.old_rect.center
+        radius = robot.radius // 3
+        cell_x, cell_y = self.get_cell((x, y))
+        reach = max(-(-2 * radius // self.cell_size), 1)
+        found = None
+        for i in range(cell_x - reach, cell_x + reach + 1):
+            for j in range(cell_y - reach, cell_y + reach + 1):
+                for place in self.cells.get((i, j), ()):
+                    if found is not None and place.order > found.order:
+                        break
+                    if (place.position[0] - x) ** 2 + (place.position[1] - y) ** 2 <= (place.radius + radius) ** 2:
+                        found = place
+                        break
+        return found
+
+    def __len__(self):
+        return len(self.places)
+
+    def __iter__(self):
+        return iter(self.places.values())
+
+
 class VisitedPlace(pygame.sprite.Sprite):
+    CELL_SIZE = max(int(8 * config.SCALING_FACTOR), 1)  # diameter of a place marked by a robot
+
     def __init__(self, robot):
         super().__init__()
         self.visit_count = 0
+        self.order = 0  # set by VisitedPlaces.add()
         self.position = robot.old_rect.center
         self.radius = robot.radius // 3
         self.rect = pygame.Rect(self.position[0] - self.radius, self.position[1] - self.radius,
@@ -268,7 +454,9 @@ class RoomArea(pygame.sprite.Sprite):
         self.visited = False
 
     def update(self):
-        """Set self.visited to True and draw accordingly."""
+        """Set self.visited to True, count it in the layout and draw accordingly."""
+        if not self.visited:
+            self.background.visited_room_cnt += 1
         self.visited = True
         if self.background.display is not None:
             pygame.draw.rect(self.background.layout,
@@ -305,7 +493,9 @@ class InjuryArea(pygame.sprite.Sprite):
             background.layout.blit(self.image, self.image.get_rect(center=self.rect.center))
 
     def update(self):
-        """Set self.rescued to True and draw accordingly."""
+        """Set self.rescued to True, count it in the layout and draw accordingly."""
+        if not self.rescued:
+            self.background.rescued_injury_cnt += 1
         self.rescued = True
         if self.background.display is not None:
             pygame.draw.rect(self.background.layout,
@@ -1,7 +1,16 @@
 from abc import ABC, abstractmethod
 from enum import Enum, auto
+from itertools import groupby
+import multiprocessing
+import multiprocessing.util
 import os
+from queue import Full
+import shutil
 import sys
+import time
+import uuid
+
+import numpy as np
 
 import config
 
@@ -10,6 +19,8 @@ class LoggerType(Enum):
     SQLite3 = auto()
     MySQL = auto()
     File = auto()
+    Queue = auto()  # to a LogWriter process
+    Shard = auto()
 
 
 class Logger:
@@ -19,16 +30,25 @@ class Logger:
         Logger.__logger = Logger.get_logger(logger_type)
 
     @staticmethod
-    def get_logger(logger_type=LoggerType.SQLite3, robot_max_cnt=10, *, is_macro_model=False, reset=False):
+    def get_logger(logger_type=LoggerType.SQLite3, *, is_macro_model=False, reset=False):
         if Logger.__logger is None:
-            if logger_type == LoggerType.SQLite3:
-                Logger.__logger = SQLite3Logger(robot_max_cnt, is_macro_model=is_macro_model, reset=reset)
-            elif logger_type == LoggerType.MySQL:
-                Logger.__logger = MySQLLogger(robot_max_cnt, is_macro_model=is_macro_model, reset=reset)
-            else:
-                Logger.__logger = FileLogger(robot_max_cnt, is_macro_model=is_macro_model, reset=reset)
+            Logger.__logger = Logger.create_logger(logger_type, is_macro_model=is_macro_model, reset=reset)
         return Logger.__logger
 
+    @staticmethod
+    def create_logger(logger_type=LoggerType.SQLite3, *, is_macro_model=False, reset=False):
+        """Creates a new logger instead of the one shared in this process."""
+        if logger_type == LoggerType.SQLite3:
+            return SQLite3Logger(is_macro_model=is_macro_model, reset=reset)
+        elif logger_type == LoggerType.MySQL:
+            return MySQLLogger(is_macro_model=is_macro_model, reset=reset)
+        elif logger_type == LoggerType.Queue:
+            return QueueLogger(is_macro_model=is_macro_model, reset=reset)
+        elif logger_type == LoggerType.Shard:
+            return ShardLogger(is_macro_model=is_macro_model, reset=reset)
+        else:
+            return FileLogger(is_macro_model=is_macro_model, reset=reset)
+
     def __enter__(self):
         return self.__logger
 
@@ -37,32 +57,86 @@ class Logger:
 
 
 class AbstractLogger(ABC):
-    def __init__(self, robot_max_cnt=10, *, is_macro_model=False):
-        if is_macro_model:
-            self.attributes_with_type = {"Action": "INT",
-                                         "JustStarted": "INT",
-                                         "FollowingWall": "INT",
-                                         "JustStartedDelta": "INT",
-                                         "FollowingWallDelta": "INT"}
-        else:
-            self.attributes_with_type = {"no": "INT",
-                                         "site_width": "INT",
-                                         "site_height": "INT",
-                                         "room_cnt": "INT",
-                                         "injury_cnt": "INT",
-                                         "departure_position": "TEXT",
-                                         "robot_type": "TEXT",
-                                         "robot_cnt": "INT",
-                                         "mode": "TEXT",
-                                         "room_visited": "INT",
-                                         "injury_rescued": "INT",
-                                         "returned": "INT",
-                                         "total_action_cnt": "INT"}
-            for i in range(robot_max_cnt):
-                self.attributes_with_type[f"robot_{i}_visits"] = "INT"
-                self.attributes_with_type[f"robot_{i}_rescues"] = "INT"
-                self.attributes_with_type[f"robot_{i}_collides"] = "INT"
+    SWEEP_KEYS = ("site_width", "site_height", "room_cnt", "injury_cnt", "departure_position", "robot_type",
+                  "robot_cnt", "mode")
+    ROBOT_ATTRIBUTE_CNT = 3
+
+    def __init__(self, *, is_macro_model=False):
+        self.is_macro_model = is_macro_model
+        self.attributes_with_type = AbstractLogger.get_attributes_with_type(is_macro_model=is_macro_model)
         self.attributes = tuple(self.attributes_with_type.keys())
+        self.insert_statements = {}
+
+    @staticmethod
+    def get_attributes_with_type(*, is_macro_model=False):
+        """Columns of the results, which can also be used without a logger, e.g., by exporters."""
+        if is_macro_model:
+            return {"Action": "INT",
+                    "JustStarted": "INT",
+                    "FollowingWall": "INT",
+                    "JustStartedDelta": "INT",
+                    "FollowingWallDelta": "INT"}
+        attributes_with_type = {"no": "INT",
+                                "site_width": "INT",
+                                "site_height": "INT",
+                                "room_cnt": "INT",
+                                "injury_cnt": "INT",
+                                "departure_position": "TEXT",
+                                "robot_type": "TEXT",
+                                "robot_cnt": "INT",
+                                "mode": "TEXT",
+                                "room_visited": "INT",
+                                "injury_rescued": "INT",
+                                "returned": "INT",
+                                "total_action_cnt": "INT",
+                                "robots": "BLOB"}  # see pack_row()
+        return attributes_with_type
+
+    def get_table_definition(self, text_key_length=None):
+        """
+        Column definitions for CREATE TABLE, with an index on the sweep keys if text_key_length is given,
+        which is needed by MySQL to index TEXT columns. Use get_index_statement() otherwise.
+        """
+        definition = ','.join((' '.join(item) for item in self.attributes_with_type.items()))
+        if text_key_length is not None and not self.is_macro_model:
+            definition += f",INDEX results_sweep ({self.get_index_columns(text_key_length)})"
+        return definition
+
+    def get_index_columns(self, text_key_length=None):
+        return ','.join(f"{key}({text_key_length})" if text_key_length is not None and
+                        self.attributes_with_type[key] == "TEXT" else key for key in AbstractLogger.SWEEP_KEYS)
+
+    def get_index_statement(self):
+        """CREATE INDEX on the sweep keys, or None for the macro model."""
+        if self.is_macro_model:
+            return None
+        return f"CREATE INDEX IF NOT EXISTS results_sweep ON results ({self.get_index_columns()});"
+
+    def pack_row(self, items):
+        """
+        Packs the (visits, rescues, collides) items of any number of robots, which follow the run-level items,
+        into the robots column by pack_robots(). Rows without them are unchanged.
+        """
+        run_attribute_cnt = len(self.attributes) - 1
+        if self.is_macro_model or len(items) <= run_attribute_cnt:
+            return items
+        return items[:run_attribute_cnt] + (self.pack_robots(items[run_attribute_cnt:]),)
+
+    def pack_robots(self, items):
+        """As int32 bytes, which are unpacked by unpack_robots()."""
+        return np.array(items, dtype=np.int32).tobytes()
+
+    @staticmethod
+    def unpack_robots(blob):
+        """Rows of (visits, rescues, collides) of each robot from the robots column."""
+        return np.frombuffer(blob, dtype=np.int32).reshape(-1, AbstractLogger.ROBOT_ATTRIBUTE_CNT)
+
+    def get_insert_statement(self, length, placeholder="?"):
+        """Parameterized INSERT of the first length attributes, which is built once per length."""
+        if length not in self.insert_statements:
+            self.insert_statements[length] = f"INSERT INTO results ({','.join(self.attributes[:length])}) " \
+                                             f"VALUES ({','.join([placeholder] * length)});"
+        return self.insert_statements[length]
 
     @abstractmethod
     def __del__(self):
@@ -76,12 +150,17 @@ class AbstractLogger(ABC):
 
     @abstractmethod
     def log(self, *items):
-        """items must be a tuple of the same order as self.attributes!!!"""
+        """
+        items must be a tuple of the same order as self.attributes!!!
+        Items of the robots are at the end, which are packed by pack_row().
+        """
 
 
 class MySQLLogger(AbstractLogger):
-    def __init__(self, robot_max_cnt=10, *, is_macro_model=False, reset=False):
-        super().__init__(robot_max_cnt, is_macro_model=is_macro_model)
+    """Rows are inserted by server-side prepared statements, one cursor per row length."""
+
+    def __init__(self, *, is_macro_model=False, reset=False):
+        super().__init__(is_macro_model=is_macro_model)
 
         import mysql.connector
 
@@ -95,9 +174,9 @@ class MySQLLogger(AbstractLogger):
         self.cursor.execute(f"USE results;")
         if reset:
             self.cursor.execute(f"DROP TABLE IF EXISTS results;")
-        self.cursor.execute(
-                f"CREATE TABLE IF NOT EXISTS results ({','.join((' '.join(item) for item in self.attributes_with_type.items()))});")
+        self.cursor.execute(f"CREATE TABLE IF NOT EXISTS results ({self.get_table_definition(text_key_length=32)});")
         self.db.commit()
+        self.insert_cursors = {}  # a prepared cursor keeps only the statement it has executed last
 
     def __del__(self):
         self.db.commit()
@@ -107,12 +186,21 @@ class MySQLLogger(AbstractLogger):
         self.db.commit()
 
     def log(self, *items):
-        self.cursor.execute(f"INSERT INTO results ({','.join(self.attributes[:len(items)])}) VALUES {items!r};")
+        items = self.pack_row(items)
+        if len(items) not in self.insert_cursors:
+            self.insert_cursors[len(items)] = self.db.cursor(prepared=True)
+        self.insert_cursors[len(items)].execute(self.get_insert_statement(len(items), "%s"), items)
 
 
 class SQLite3Logger(AbstractLogger):
-    def __init__(self, robot_max_cnt=10, *, is_macro_model=False, reset=False):
-        super().__init__(robot_max_cnt, is_macro_model=is_macro_model)
+    """
+    Rows are buffered and written in one transaction per config.SQLITE_COMMIT_ROW_CNT rows
+    or config.SQLITE_COMMIT_INTERVAL seconds, and when exiting the context.
+    The database is in WAL mode so that readers and the other writers are blocked as little as possible.
+    """
+
+    def __init__(self, *, is_macro_model=False, reset=False):
+        super().__init__(is_macro_model=is_macro_model)
 
         import sqlite3
 
@@ -120,26 +208,50 @@ class SQLite3Logger(AbstractLogger):
             os.mkdir(config.RESULT_DIR)
         is_exist = os.path.exists(f"{config.RESULT_DIR}/results.db")
         if reset and is_exist:
-            os.remove(f"{config.RESULT_DIR}/results.db")
-        self.db = sqlite3.connect(f"{config.RESULT_DIR}/results.db")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(f"{config.RESULT_DIR}/results.db{suffix}"):
+                    os.remove(f"{config.RESULT_DIR}/results.db{suffix}")
+        self.db = sqlite3.connect(f"{config.RESULT_DIR}/results.db", timeout=config.SQLITE_BUSY_TIMEOUT)
         self.cursor = self.db.cursor()
+        self.cursor.execute("PRAGMA journal_mode=WAL;")
         if reset or not is_exist:
-            self.cursor.execute(
-                f"CREATE TABLE results ({','.join((' '.join(item) for item in self.attributes_with_type.items()))});")
+            self.cursor.execute(f"CREATE TABLE IF NOT EXISTS results ({self.get_table_definition()});")
+            if self.get_index_statement() is not None:
+                self.cursor.execute(self.get_index_statement())
             self.db.commit()
+        self.rows = []
+        self.last_commit_time = time.monotonic()
 
     def __del__(self):
+        self.flush()
         self.db.close()
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
     def log(self, *items):
-        self.cursor.execute(f"INSERT INTO results ({','.join(self.attributes[:len(items)])}) VALUES {items!r};")
+        if len(self.rows) == 0:
+            self.last_commit_time = time.monotonic()
+        self.rows.append(self.pack_row(items))
+        if len(self.rows) >= config.SQLITE_COMMIT_ROW_CNT or \
+                time.monotonic() - self.last_commit_time >= config.SQLITE_COMMIT_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered rows in a single transaction, keeping their order."""
+        if len(self.rows) == 0:
+            return
+        for length, rows in groupby(self.rows, len):
+            self.cursor.executemany(self.get_insert_statement(length), rows)  # the same str hits sqlite3's cache
         self.db.commit()
+        self.rows.clear()
+        self.last_commit_time = time.monotonic()
 
 
 class FileLogger(AbstractLogger):
     """Must use a lock when using this logger in a multiprocessing environment!!!"""
-    def __init__(self, robot_max_cnt=10, *, is_macro_model=False, reset=False):
-        super().__init__(robot_max_cnt, is_macro_model=is_macro_model)
+    def __init__(self, *, is_macro_model=False, reset=False):
+        super().__init__(is_macro_model=is_macro_model)
 
         import logging
         from logging.handlers import QueueHandler, QueueListener
@@ -170,14 +282,18 @@ class FileLogger(AbstractLogger):
         self.file_listener.start()
 
         if reset:
-            self.log(*self.attributes)
+            self.logger.info(",".join(self.attributes))
 
     def __del__(self):
         self.console_listener.stop()
         self.file_listener.stop()
 
     def log(self, *items):
-        self.logger.info(",".join(map(str, items)))
+        self.logger.info(",".join(map(str, self.pack_row(items))))
+
+    def pack_robots(self, items):
+        """Space-separated, like db_to_csv.py exports them."""
+        return " ".join(map(str, items))
 
     def info(self, msg):
         self.logger.info(msg)
@@ -187,3 +303,166 @@ class FileLogger(AbstractLogger):
 
     def critical(self, msg):
         self.logger.critical(msg)
+
+
+class ShardLogger(AbstractLogger):
+    """
+    Appends rows to columnar chunks of this process in config.SHARD_DIR, i.e., .npz files with an array per column,
+    which are merged into a memory-mappable .npy per column by merge_shards.py.
+    A chunk is written once config.SHARD_ROW_CNT rows are buffered when exiting the context, and at process exit.
+    Items missing from short rows are stored as MISSING_VALUES.
+    The robots column is the int32 (visits, rescues, collides) of all the robots of all the rows, one robot per row.
+    Those of a row start at its robots_offset and end at the robots_offset of the next row, see split_robots().
+    """
+    DTYPES = {"INT": np.int64, "TEXT": np.str_}
+    MISSING_VALUES = {"INT": -1, "TEXT": ""}
+
+    def __init__(self, *, is_macro_model=False, reset=False):
+        super().__init__(is_macro_model=is_macro_model)
+        if reset and os.path.exists(config.SHARD_DIR):
+            shutil.rmtree(config.SHARD_DIR)
+        os.makedirs(config.SHARD_DIR, exist_ok=True)
+        self.pid = None
+        self.init_process()
+
+    def init_process(self):
+        """Starts the shard of this process, which may have inherited self by forking."""
+        self.pid = os.getpid()
+        self.shard_id = f"{self.pid}_{uuid.uuid4().hex[:8]}"
+        self.chunk_cnt = 0
+        self.rows = []
+        multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+
+    def __del__(self):
+        self.flush()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if len(self.rows) >= config.SHARD_ROW_CNT:
+            self.flush()
+
+    def log(self, *items):
+        if self.pid != os.getpid():
+            self.init_process()
+        self.rows.append(self.pack_row(items))
+
+    def pack_robots(self, items):
+        return np.array(items, dtype=np.int32).reshape(-1, AbstractLogger.ROBOT_ATTRIBUTE_CNT)
+
+    @staticmethod
+    def split_robots(robots, offsets):
+        """The robots of each row, given the robots and robots_offset columns of a chunk or of the merged columns."""
+        return np.split(robots, offsets[1:])
+
+    def flush(self):
+        if len(self.rows) == 0 or self.pid != os.getpid():
+            return
+        columns = {}
+        for i, (attribute, attribute_type) in enumerate(self.attributes_with_type.items()):
+            if attribute_type == "BLOB":
+                robots = [row[i] if i < len(row) else np.empty((0, AbstractLogger.ROBOT_ATTRIBUTE_CNT), np.int32)
+                          for row in self.rows]
+                columns[attribute] = np.concatenate(robots)
+                columns[f"{attribute}_offset"] = np.cumsum([0] + [len(row) for row in robots[:-1]], dtype=np.int64)
+                continue
+            missing_value = ShardLogger.MISSING_VALUES[attribute_type]
+            columns[attribute] = np.array([row[i] if i < len(row) else missing_value for row in self.rows],
+                                          dtype=ShardLogger.DTYPES[attribute_type])
+        path = f"{config.SHARD_DIR}/{self.shard_id}_{self.chunk_cnt:06}.npz"
+        with open(f"{path}.tmp", "wb") as file:  # so that merge_shards.py never reads a partial chunk
+            np.savez(file, **columns)
+        os.replace(f"{path}.tmp", path)
+        self.chunk_cnt += 1
+        self.rows = []
+
+
+class QueueLogger(AbstractLogger):
+    """
+    Sends rows to a LogWriter process, one batch per context, instead of writing them to a database.
+    QueueLogger.queue must be set by QueueLogger.init_worker() in each process, e.g., as the initializer of a Pool.
+    """
+    queue = None
+    stopped = None  # set once the LogWriter takes nothing any more
+
+    def __init__(self, *, is_macro_model=False, reset=False):
+        super().__init__(is_macro_model=is_macro_model)
+        self.rows = []
+
+    @staticmethod
+    def init_worker(queue, stopped):
+        QueueLogger.queue = queue
+        QueueLogger.stopped = stopped
+
+    def __del__(self):
+        self.flush()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    def log(self, *items):
+        self.rows.append(items)
+
+    def flush(self):
+        """
+        Blocks while the queue is full, which slows the workers down to the pace of the writer.
+        Raises an Exception instead if the writer has stopped, or has taken nothing for config.LOG_QUEUE_TIMEOUT seconds.
+        """
+        if len(self.rows) == 0:
+            return
+        deadline = time.monotonic() + config.LOG_QUEUE_TIMEOUT
+        while not QueueLogger.stopped.is_set():
+            try:
+                QueueLogger.queue.put(self.rows, timeout=1)
+                self.rows = []
+                return
+            except Full:
+                if time.monotonic() >= deadline:
+                    break
+        QueueLogger.queue.cancel_join_thread()  # nobody reads what is still buffered, so do not wait for it at exit
+        raise Exception(f"LogWriter is not taking rows, {len(self.rows)} rows are lost!")
+
+
+class LogWriter:
+    """
+    Process that drains the rows sent by QueueLoggers into a logger of logger_type,
+    so that only a single process writes to the database or the file.
+    """
+
+    def __init__(self, logger_type=LoggerType.SQLite3, *, is_macro_model=False, reset=False):
+        self.queue = multiprocessing.Queue(config.LOG_QUEUE_SIZE)
+        self.stopped = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=LogWriter.write, args=(
+            self.queue, self.stopped, logger_type, is_macro_model, reset), name="LogWriter")
+
+    def __enter__(self):
+        self.process.start()
+        return self
+
+    def is_alive(self):
+        return self.process.is_alive() and not self.stopped.is_set()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        while self.is_alive():
+            try:
+                self.queue.put(None, timeout=1)
+                break
+            except Full:
+                pass
+        else:
+            self.queue.cancel_join_thread()  # nobody reads the queue, so do not wait for it at exit
+        self.process.join()
+        if self.process.exitcode != 0 and exc_type is None:
+            raise Exception(f"LogWriter exited with {self.process.exitcode}, some rows may not have been written!")
+
+    @staticmethod
+    def write(queue, stopped, logger_type, is_macro_model, reset):
+        """
+        Writes the rows until None is received. An error stops the writer after setting stopped,
+        so that QueueLoggers and LogWriter.__exit__() raise instead of waiting for it forever.
+        """
+        try:
+            with Logger.create_logger(logger_type, is_macro_model=is_macro_model, reset=reset) as logger:
+                while (rows := queue.get()) is not None:
+                    for items in rows:
+                        logger.log(*items)
+        finally:
+            stopped.set()
@@ -0,0 +1,55 @@
+import glob
+import os
+
+import numpy as np
+
+import config
+
+
+def merge_shards(shard_dir=config.SHARD_DIR, column_dir=config.COLUMN_DIR):
+    """
+    Concatenates the columns of all the chunks written by ShardLogger into column_dir/<column>.npy.
+    Returns the number of rows.
+    NOTE: The robots column has a row per robot, so it is longer than the others. The robots_offset column is
+          rebased to index the merged robots column, so ShardLogger.split_robots() works on both.
+    """
+    paths = sorted(glob.glob(f"{shard_dir}/*.npz"))
+    if len(paths) == 0:
+        raise Exception(f"No shards in {shard_dir}!")
+    lengths = {}
+    dtypes = {}
+    shapes = {}  # of an item, e.g., (3,) for the robots column
+    for path in paths:
+        with np.load(path) as chunk:
+            for column in chunk.files:
+                array = chunk[column]
+                lengths[column] = lengths.get(column, 0) + len(array)
+                dtypes[column] = np.result_type(dtypes[column], array.dtype) if column in dtypes else array.dtype
+                shapes[column] = array.shape[1:]
+    os.makedirs(column_dir, exist_ok=True)
+    merged = {column: np.lib.format.open_memmap(f"{column_dir}/{column}.npy", "w+", dtype,
+                                                (lengths[column], *shapes[column]))
+              for column, dtype in dtypes.items()}
+    starts = dict.fromkeys(merged, 0)
+    for path in paths:
+        with np.load(path) as chunk:
+            chunk_starts = dict(starts)
+            for column in chunk.files:
+                array = chunk[column]
+                if column.endswith("_offset") and column[:-len("_offset")] in chunk_starts:
+                    array = array + chunk_starts[column[:-len("_offset")]]
+                merged[column][starts[column]:starts[column] + len(array)] = array
+                starts[column] += len(array)
+    for array in merged.values():
+        array.flush()
+    return lengths[next(iter(lengths))]
+
+
+def load_columns(column_dir=config.COLUMN_DIR):
+    """Memory-maps the merged columns as {column: array}."""
+    return {os.path.splitext(os.path.basename(path))[0]: np.load(path, mmap_mode="r")
+            for path in sorted(glob.glob(f"{column_dir}/*.npy"))}
+
+
+if __name__ == '__main__':
+    print(f"Merged {merge_shards()} rows into {config.COLUMN_DIR}.")
@@ -6,10 +6,97 @@ from robots.robot_using_gas import *
 from robots.robot_using_sound import *
 from robots.robot_using_gas_and_sound import *
 
+SPAWN_OFFSETS = utils.get_polar_offset_table(int(Wall.SPAN_UNIT * 2))  # indexed by azimuth
+
+
+class RobotGroup(pygame.sprite.Group):
+    """
+    Group of robots that also keeps a cell list of their centers as the broad phase of robot-robot collisions,
+    and the centers as an array with their sum for sensing the others.
+    A robot is re-placed right after its own update, which is the only time its rect changes.
+    It also counts mission_completed robots, see Robot.complete_mission().
+    """
+
+    def __init__(self, cell_size=Robot.WIDTH):
+        super().__init__()
+        self.cell_size = cell_size  # colliding robots are at most one cell away from each other
+        self.cells = {}
+        self.robot_cells = {}
+        self.robot_indices = {}  # rows of self.centers, in group order
+        self.centers = np.empty((0, 2), dtype=np.int64)
+        self.center_sum = [0, 0]
+        self.completed_cnt = 0
+
+    def get_cell(self, position):
+        return int(position[0] // self.cell_size), int(position[1] // self.cell_size)
+
+    def place(self, robot):
+        center = robot.rect.center
+        i = self.robot_indices[robot]
+        old_x, old_y = self.centers[i].tolist()
+        self.center_sum[0] += center[0] - old_x
+        self.center_sum[1] += center[1] - old_y
+        self.centers[i] = center
+        cell = self.get_cell(center)
+        old_cell = self.robot_cells.get(robot)
+        if cell != old_cell:
+            if old_cell is not None:
+                self.cells[old_cell].remove(robot)
+            self.cells.setdefault(cell, []).append(robot)
+            self.robot_cells[robot] = cell
+
+    def get_neighbours(self, position):
+        """Robots whose centers are in the cells around position, which include all robots that may collide."""
+        x, y = self.get_cell(position)
+        for i in (x - 1, x, x + 1):
+            for j in (y - 1, y, y + 1):
+                yield from self.cells.get((i, j), ())
+
+    def get_offset_sum(self, position, robot):
+        """
+        Sum of utils.pygame_cartesian_diff_vec(position, other.rect.center) of all the robots other than robot,
+        from the sum of the centers instead of iterating the robots.
+        """
+        x, y = self.centers[self.robot_indices[robot]].tolist()
+        cnt = len(self.robot_indices) - 1
+        return pygame.Vector2((self.center_sum[0] - x) - cnt * position[0],
+                              cnt * position[1] - (self.center_sum[1] - y))
+
+    def get_offsets(self, position, robot):
+        """utils.pygame_cartesian_diff_vec(position, other.rect.center) of the robots other than robot as rows."""
+        offsets = np.delete(self.centers, self.robot_indices[robot], axis=0) - np.asarray(position, dtype=np.float64)
+        offsets[:, 1] = -offsets[:, 1]
+        return offsets
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.robot_indices[sprite] = len(self.centers)
+        self.centers = np.concatenate((self.centers, [[0, 0]]))
+        self.place(sprite)
+        self.completed_cnt += sprite.mission_complete
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.cells[self.robot_cells.pop(sprite)].remove(sprite)
+        i = self.robot_indices.pop(sprite)
+        x, y = self.centers[i].tolist()
+        self.center_sum[0] -= x
+        self.center_sum[1] -= y
+        self.centers = np.delete(self.centers, i, axis=0)
+        for robot, j in self.robot_indices.items():
+            if j > i:
+                self.robot_indices[robot] = j - 1
+        self.completed_cnt -= sprite.mission_complete
+
+    def update(self, *args, **kwargs):
+        for robot in self.sprites():
+            robot.update(*args, **kwargs)
+            self.place(robot)
+
 
 class AbstractRobotManager(ABC):
     def __init__(self, robot_type, logger, background, *, depart_from_edge=False, act_after_finding_injury=False):
-        self.robots = pygame.sprite.Group()
+        self.robots = RobotGroup()
         self.robot_type = robot_type
         self.logger = logger
         self.background: Layout = background
@@ -28,10 +115,11 @@ class AbstractRobotManager(ABC):
     def update(self):
         """Redraw method that should be called for each frame, but must after redrawing layout."""
         self.action_count += 1
-        if self.act_after_finding_injury and self.first_injury_action_count == 0 and any(self.robots):
+        if self.act_after_finding_injury and self.first_injury_action_count == 0 and self.robots.completed_cnt != 0:
             self.first_injury_action_count = self.action_count
         self.robots.update()
-        pygame.display.set_caption(f"Action {self.action_count}")
+        if self.background.display is not None:
+            pygame.display.set_caption(f"Action {self.action_count}")
 
     def enter_gathering_mode(self):
         self.first_injury_action_count = self.action_count
@@ -61,11 +149,7 @@ class AbstractRobotManager(ABC):
         return report
 
     def report_gather(self):
-        count = 0
-        for robot in self.robots:
-            if robot.mission_complete:  # OK
-                count += 1
-        return count
+        return self.robots.completed_cnt
 
     def __len__(self):
         return len(self.robots)
@@ -81,7 +165,7 @@ class AbstractRobotManager(ABC):
 
     def __bool__(self):
         """all(self.robots) are mission_completed."""
-        return all(self.robots)
+        return self.robots.completed_cnt == len(self.robots)
 
 
 class SpreadingRobotManager(AbstractRobotManager):
@@ -97,7 +181,7 @@ class SpreadingRobotManager(AbstractRobotManager):
                 azimuth = 180 * i // (amount - int(amount > 1))
             else:
                 azimuth = 360 * i // amount
-            dx, dy = utils.polar_to_pygame_cartesian(int(Wall.SPAN_UNIT * 2), azimuth)
+            dx, dy = SPAWN_OFFSETS[azimuth]
             self.robots.add(self.robot_type(i, self.logger, self.robots, self.background,
                                             (position[0] + dx, position[1] + dy), azimuth,
                                             act_after_finding_injury=self.act_after_finding_injury))
@@ -119,7 +203,7 @@ class RandomSpreadingRobotManager(AbstractRobotManager):
             if azimuth < 0:
                 azimuth += 360  # OK
                 # azimuth += 180 if self.depart_from_edge else 360
-            dx, dy = utils.polar_to_pygame_cartesian(int(Wall.SPAN_UNIT * 2), azimuth)
+            dx, dy = SPAWN_OFFSETS[azimuth]
             self.robots.add(self.robot_type(i, self.logger, self.robots, self.background,
                                             (position[0] + dx, position[1] + dy), azimuth,
                                             act_after_finding_injury=self.act_after_finding_injury))
@@ -141,7 +225,7 @@ class CollidingRobotManager(AbstractRobotManager):
                 azimuth = 180 * i // (amount - int(amount > 1))
             else:
                 azimuth = 360 * i // amount
-            dx, dy = utils.polar_to_pygame_cartesian(int(Wall.SPAN_UNIT * 2), azimuth)
+            dx, dy = SPAWN_OFFSETS[azimuth]
             self.robots.add(self.robot_type(i, self.logger, self.robots, self.background,
                                             (position[0] + dx, position[1] + dy),
                                             azimuth + 180, act_after_finding_injury=self.act_after_finding_injury))
@@ -161,7 +245,7 @@ class FreeRobotManager(AbstractRobotManager):
                 azimuth = 180 * i // (amount - int(amount > 1))
             else:
                 azimuth = 360 * i // amount
-            dx, dy = utils.polar_to_pygame_cartesian(int(Wall.SPAN_UNIT * 2), azimuth)
+            dx, dy = SPAWN_OFFSETS[azimuth]
             self.robots.add(self.robot_type(i, self.logger, self.robots, self.background,
                                             (position[0] + dx, position[1] + dy),
                                             act_after_finding_injury=self.act_after_finding_injury))
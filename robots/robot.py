@@ -11,6 +11,7 @@ class Robot(pygame.sprite.Sprite):
     WIDTH = int(24 * config.SCALING_FACTOR)
     SIZE = (WIDTH, WIDTH)
     radius = WIDTH // 2
+    STEP_OFFSETS = utils.get_polar_offset_table(radius, truncate=True)  # indexed by azimuth
 
     class JustStartedState(AbstractState):
         def transfer_when_colliding_wall(self):
@@ -104,7 +105,7 @@ class Robot(pygame.sprite.Sprite):
 
     def turn_to_azimuth(self, azimuth):
         self.azimuth = utils.normalize_azimuth(int(azimuth))
-        self.direction = utils.azimuth_to_direction(self.azimuth)
+        self.direction = utils.AZIMUTH_DIRECTIONS[self.azimuth]
         if self.background.display is not None:
             self.image = pygame.transform.rotate(self.original_image, self.azimuth)
             self.rect = self.image.get_rect(center=self.position)
@@ -148,7 +149,7 @@ class Robot(pygame.sprite.Sprite):
               OTHERWISE IT WILL HAVE STRANGE BEHAVIOR DUE TO PRECISION LOSS OF ROUNDING OF FLOATING POINT NUMBERS!!!
         """
         self.old_rect = self.rect.copy()
-        self.rect.move_ip(*utils.polar_to_pygame_cartesian(Robot.radius, self.azimuth))
+        self.rect.move_ip(*Robot.STEP_OFFSETS[self.azimuth])
 
     def cancel_go_front(self):
         self.rect = self.old_rect
@@ -157,7 +158,7 @@ class Robot(pygame.sprite.Sprite):
         self.position = self.rect.center
 
     def go_front_not_cancellable(self):
-        self.rect.move_ip(*utils.polar_to_pygame_cartesian(Robot.radius, self.azimuth))
+        self.rect.move_ip(*Robot.STEP_OFFSETS[self.azimuth])
         self.position = self.rect.center
 
     def get_wall_rank(self, sprite: pygame.sprite.Sprite):
@@ -175,9 +176,7 @@ class Robot(pygame.sprite.Sprite):
 
     def turn_according_to_wall(self):
         """NOTE: Updates self.just_followed_wall."""
-        adjacent_walls = set(pygame.sprite.spritecollide(self.just_followed_wall, self.background.walls, False))
-        # adjacent_walls.discard(self.just_followed_wall)
-        self.just_followed_wall = min(adjacent_walls, key=self.get_wall_rank)
+        self.just_followed_wall = min(self.just_followed_wall.adjacent_walls, key=self.get_wall_rank)
         wall = self.just_followed_wall.rect
         if self.direction == Direction.NORTH:
             if wall.left > self.rect.right:
@@ -203,11 +202,11 @@ class Robot(pygame.sprite.Sprite):
             raise Exception(f"[{self}] has invalid direction: {self.direction}.")
 
     def is_colliding_wall(self):
-        self.collided_wall = pygame.sprite.spritecollideany(self, self.background.walls)
+        self.collided_wall = self.background.wall_grid.collide_any(self.rect)
         return self.collided_wall
 
     def is_colliding_another_robot(self):
-        for robot in self.group:
+        for robot in self.group.get_neighbours(self.rect.center):
             if robot != self and pygame.sprite.collide_circle(robot, self):
                 self.colliding_others_count += 1
                 return True
@@ -254,10 +253,17 @@ class Robot(pygame.sprite.Sprite):
             else:
                 self.turn_right(self.azimuth + 90)
 
+    def complete_mission(self):
+        """Enters self.found_injury_state, which is final, and counts self as mission_completed in self.group."""
+        if not self.mission_complete:
+            self.mission_complete = True
+            self.group.completed_cnt += 1
+        self.state = self.found_injury_state
+
     def has_found_injuries(self):
         """Returns according to self.act_after_finding_injury."""
         if self.act_after_finding_injury:
-            self.found_injuries = pygame.sprite.spritecollide(self, self.background.injuries, False)
+            _, self.found_injuries = self.background.get_entered_areas(self.rect)
             return len(self.found_injuries) != 0
             # if returns True, self.mission_complete will be set to True and self will be in FoundInjuryState
         return False
@@ -270,7 +276,7 @@ class Robot(pygame.sprite.Sprite):
         """
         self.state.transfer_to_next_state()
         self.action_count += 1
-        entered_rooms = pygame.sprite.spritecollide(self, self.background.rooms, False)
+        entered_rooms, rescued_injuries = self.background.get_entered_areas(self.rect)
         # self.logger.debug(f"[{self}] entered_rooms == {entered_rooms}")
         # self.logger.debug(f"[{self}] in_room == {self.in_room}")
         if len(entered_rooms) != 0:
@@ -281,13 +287,15 @@ class Robot(pygame.sprite.Sprite):
                     room.update()
         else:  # may be modified
             self.in_room = False
-        rescued_injuries = pygame.sprite.spritecollide(self, self.background.injuries, False)
         if len(rescued_injuries) != 0:
             self.in_room = True
             for injury in rescued_injuries:
                 if not injury.rescued:  # OK
                     self.rescue_count += 1
                     injury.update()
+        self.draw()
+
+    def draw(self):
         if self.background.display is not None:
             self.background.display.blit(self.image, self.rect)
 
@@ -357,7 +365,7 @@ class GatherableRobot(Robot):
 
     def others_have_found_injuries(self):
         """Returns according to self.act_after_finding_injury."""
-        if self.act_after_finding_injury:
+        if self.act_after_finding_injury and self.group.completed_cnt != 0:
             for robot in self.group:
                 if robot != self and robot.state == self.found_injury_state:  # OK
                     self.found_injuries = robot.found_injuries  # OK
@@ -375,8 +383,7 @@ class GatherableRobot(Robot):
                                                self.found_injuries[0].rect.center).length() > GatherableRobot.GATHER_THRESH
 
     def get_nearest_door_vector(self) -> pygame.Vector2:
-        door = min(self.background.doors,
-                   key=lambda d: utils.pygame_cartesian_diff_vec(self.rect.center, d.position).length())
+        door = self.background.get_nearest_door(self.rect.center)
         return utils.pygame_cartesian_diff_vec(self.rect.center, door.position)
 
     def get_gathering_vector(self) -> pygame.Vector2:
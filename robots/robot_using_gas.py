@@ -37,12 +37,10 @@ class RobotUsingGas(Robot):
 
     def commit_go_front(self):
         self.position = self.rect.center
-        self.background.visited_places.add(VisitedPlace(self))
+        self.background.visited_places.add(self)
 
     def is_revisiting_places(self):
-        # return VisitedPlace(self) in self.background.visited_places
-        place = pygame.sprite.spritecollideany(VisitedPlace(self),
-                                               self.background.visited_places, pygame.sprite.collide_circle)
+        place = self.background.visited_places.find(self)
         if place is not None:
             place.visit_count += 1  # OK
             self.just_visited_place = place
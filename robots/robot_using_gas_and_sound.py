@@ -63,13 +63,7 @@ class RobotUsingGasAndSound(RobotUsingGas, RobotUsingSound):
             self.original_azimuth = utils.normalize_azimuth(self.original_azimuth + 180)
             return self.original_azimuth  # may be modified
         else:
-            vector = pygame.Vector2()
-            for robot in self.group:
-                if robot != self:
-                    vector += utils.pygame_cartesian_diff_vec(self.position, robot.rect.center)
-            vector: pygame.Vector2 = -vector  # OK to use __neg__
-            _, azimuth = vector.as_polar()
-            return int(azimuth)
+            return super().get_azimuth_according_to_others()
 
     def get_weighted_azimuth_according_to_others(self):
         if self.is_revisiting_places() and self.just_visited_place.visit_count >= 3:
@@ -80,12 +74,4 @@ class RobotUsingGasAndSound(RobotUsingGas, RobotUsingSound):
             self.original_azimuth = utils.normalize_azimuth(self.original_azimuth + 180)
             return self.original_azimuth  # may be modified
         else:
-            vector = pygame.Vector2()
-            for robot in self.group:
-                if robot != self:
-                    diff_vec = utils.pygame_cartesian_diff_vec(self.position, robot.rect.center)
-                    dist, _ = diff_vec.as_polar()
-                    vector += diff_vec / dist
-            vector: pygame.Vector2 = -vector
-            _, azimuth = vector.as_polar()
-            return int(azimuth)
+            return super().get_weighted_azimuth_according_to_others()
@@ -48,21 +48,14 @@ class RobotUsingSound(GatherableRobot):
                 robot.collide_turn_function(90)
 
     def get_azimuth_according_to_others(self):
-        vector = pygame.Vector2()
-        for robot in self.group:
-            if robot != self:
-                vector += utils.pygame_cartesian_diff_vec(self.position, robot.rect.center)
+        vector = self.group.get_offset_sum(self.position, self)
         vector: pygame.Vector2 = -vector  # OK to use __neg__
         _, azimuth = vector.as_polar()
         return int(azimuth)
 
     def get_weighted_azimuth_according_to_others(self):
-        vector = pygame.Vector2()
-        for robot in self.group:
-            if robot != self:
-                diff_vec = utils.pygame_cartesian_diff_vec(self.position, robot.rect.center)
-                dist, _ = diff_vec.as_polar()
-                vector += diff_vec / dist
+        offsets = self.group.get_offsets(self.position, self)
+        vector = pygame.Vector2(*(offsets / np.hypot(offsets[:, 0], offsets[:, 1])[:, None]).sum(axis=0))
         vector: pygame.Vector2 = -vector
         _, azimuth = vector.as_polar()
         return int(azimuth)
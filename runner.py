@@ -3,14 +3,16 @@ from multiprocessing import Pool, Lock
 
 from psutil import cpu_count
 
+from generator import SiteGenerationError
 from logger import *
 from robot_manager import *
+from vectorized_robot_manager import *
 
 
 class AbstractRunner(ABC):
-    def __init__(self, logger_type=LoggerType.SQLite3, max_robot_cnt=10, *, is_macro_model=False, enable_display=True):
+    def __init__(self, logger_type=LoggerType.SQLite3, *, is_macro_model=False, enable_display=True):
         self.logger_type = logger_type
-        self.logger = Logger.get_logger(logger_type, max_robot_cnt, is_macro_model=is_macro_model, reset=True)
+        self.logger = Logger.get_logger(logger_type, is_macro_model=is_macro_model, reset=True)
         self.frame_rate = config.DISPLAY_FREQUENCY
         if enable_display:
             pygame.init()
@@ -37,17 +39,28 @@ class AbstractRunner(ABC):
 class StatisticRunner(AbstractRunner):
     lock = Lock()
 
-    def __init__(self, logger_type):
-        super().__init__(logger_type, enable_display=False)
+    def __init__(self, logger_type, *, vectorized=False, dedicated_writer=False):
+        """
+        If vectorized, swarms which VectorizedRobotManager supports and simulates faster are simulated with it.
+        If dedicated_writer, workers send their rows to a single LogWriter process writing with logger_type.
+        """
+        super().__init__(LoggerType.Queue if dedicated_writer else logger_type, enable_display=False)
+        self.vectorized = vectorized
+        self.writer_logger_type = logger_type if dedicated_writer else None
+
+    def get_manager_type(self, robot_type, robot_cnt):
+        if self.vectorized and VectorizedRobotManager.supports(robot_type, robot_cnt):
+            return VectorizedRobotManager
+        return RandomSpreadingRobotManager
 
     @staticmethod
     def run(i, site_width, site_height, generator, logger_type, depart_from_edge, robot_type, robot_cnt,
-            max_search_action_cnt, max_return_action_cnt):
+            max_search_action_cnt, max_return_action_cnt, manager_type=RandomSpreadingRobotManager):
         try:
             with Logger(logger_type) as logger:
                 layout = Layout.from_generator(generator, enable_display=False, depart_from_edge=depart_from_edge)
-                manager = RandomSpreadingRobotManager(robot_type, logger, layout, robot_cnt,
-                                                      depart_from_edge=depart_from_edge, act_after_finding_injury=False)
+                manager = manager_type(robot_type, logger, layout, robot_cnt,
+                                       depart_from_edge=depart_from_edge, act_after_finding_injury=False)
                 while not (layout or manager.action_count >= max_search_action_cnt):
                     manager.update()
                     if manager.action_count % 100 == 0:
@@ -78,45 +91,146 @@ class StatisticRunner(AbstractRunner):
             import traceback
             traceback.print_exc()
 
+    def submit(self, pool, i, site_width, site_height, generator, depart_from_edge, robot_type, robot_cnt,
+               max_search_action_cnt, max_return_action_cnt):
+        """
+        Submits the runs of a configuration to the pool. Returns the AsyncResults.
+        Only the seed and the parameters of generator are sent, see SiteGenerator.__reduce__().
+        """
+        return [pool.apply_async(self.run, (i, site_width, site_height, generator, self.logger_type, depart_from_edge,
+                                            robot_type, robot_cnt, max_search_action_cnt, max_return_action_cnt,
+                                            self.get_manager_type(robot_type, robot_cnt)))]
+
     @utils.timed
     def start(self):
+        if self.writer_logger_type is None:
+            self.start_pool()
+        else:
+            with LogWriter(self.writer_logger_type, reset=True) as writer:
+                self.start_pool(QueueLogger.init_worker, (writer.queue, writer.stopped), writer)
+
+    def start_pool(self, initializer=None, initargs=(), writer=None):
+        """If writer, a LogWriter, stops before the workers finish, they are terminated instead of waited for."""
         site_width, site_height, room_cnt, injury_cnt, max_search_action_cnt, max_return_action_cnt = \
             60, 30, 30, 10, 1000, 250  # small
         # 80, 40, 60, 10, 2000, 500  # medium
         # 120, 60, 120, 10, 4000, 1000  # large
         workers = []
-        with Pool(cpu_count(logical=False)) as p:
+        with Pool(cpu_count(logical=False), initializer, initargs) as p:
             # Physical cores are used instead of logical ones because there are no benefits of using hyper-threading
             # on the latest Intel processors.
+            seeds = random.Random(config.SITE_SEED)
             for i in range(config.MAX_ITER):
                 try:
-                    generator = SiteGenerator(site_width, site_height, room_cnt, injury_cnt)
-                except:
-                    print(f"Generation {i} failed. Skipped.", file=sys.stderr)
+                    generator = SiteGenerator.load_with_retry(site_width, site_height, room_cnt, injury_cnt, seeds)
+                except SiteGenerationError as e:
+                    print(f"Generation {i} failed: {e}. Skipped.", file=sys.stderr)
                     continue
                 for robot_cnt in (2, 4, 6, 8, 10):
                     for robot_type in (RandomRobot, Robot, RobotUsingSound, RobotUsingGas, RobotUsingGasAndSound):
-                        workers.append(p.apply_async(self.run, (
-                                            i, site_width, site_height, generator, self.logger_type, False, robot_type,
-                                            robot_cnt, max_search_action_cnt, max_return_action_cnt)))
-                        workers.append(p.apply_async(self.run, (
-                                            i, site_width, site_height, generator, self.logger_type, True, robot_type,
-                                            robot_cnt, max_search_action_cnt, max_return_action_cnt)))
+                        for depart_from_edge in (False, True):
+                            workers += self.submit(p, i, site_width, site_height, generator, depart_from_edge,
+                                                   robot_type, robot_cnt, max_search_action_cnt, max_return_action_cnt)
             cnt = len(workers)
             for i, worker in enumerate(workers):
-                worker.wait()
+                while not worker.ready():
+                    worker.wait(1)
+                    if writer is not None and not writer.is_alive():
+                        raise Exception("LogWriter has stopped, so the remaining runs are terminated!")
                 print(f"{i + 1:4} of {cnt} ({(i + 1) / cnt:6.2%}) finished with status {worker.get()}.")
+            if writer is not None and not writer.is_alive():
+                raise Exception("LogWriter has stopped, so the workers are terminated!")
+            p.close()
+            p.join()  # lets the workers exit normally, so everything they have queued is sent
+
+
+class EnsembleStatisticRunner(StatisticRunner):
+    SEARCH, RETURN, FINISHED = range(3)
+
+    def __init__(self, logger_type, replicates=32, *, vectorized=False, dedicated_writer=False):
+        """
+        Each configuration is run replicates times as separate tasks. If vectorized, the replicates which
+        EnsembleRobotManager supports and simulates faster are run as a single task stepping them in lock-step instead.
+        """
+        super().__init__(logger_type, vectorized=vectorized, dedicated_writer=dedicated_writer)
+        self.replicates = replicates
+
+    def submit(self, pool, i, site_width, site_height, generator, depart_from_edge, robot_type, robot_cnt,
+               max_search_action_cnt, max_return_action_cnt):
+        """
+        Submits either one ensemble task or one StatisticRunner task per replicate. Returns the AsyncResults.
+        NOTE: StatisticRunner.submit() is called in a plain loop, since zero-argument super() does not work
+              in a comprehension.
+        """
+        if not (self.vectorized and EnsembleRobotManager.supports(robot_type, robot_cnt * self.replicates)):
+            workers = []
+            for _ in range(self.replicates):
+                workers += super().submit(pool, i, site_width, site_height, generator, depart_from_edge,
+                                          robot_type, robot_cnt, max_search_action_cnt, max_return_action_cnt)
+            return workers
+        return [pool.apply_async(self.run_ensemble, (i, site_width, site_height, generator, self.logger_type,
+                                                     depart_from_edge, robot_type, robot_cnt, self.replicates,
+                                                     max_search_action_cnt, max_return_action_cnt))]
+
+    @staticmethod
+    def run_ensemble(i, site_width, site_height, generator, logger_type, depart_from_edge, robot_type, robot_cnt,
+                     replicates, max_search_action_cnt, max_return_action_cnt):
+        """Same as StatisticRunner.run() for each replicate, but all of them are stepped together."""
+        SEARCH, RETURN, FINISHED = EnsembleStatisticRunner.SEARCH, EnsembleStatisticRunner.RETURN, \
+            EnsembleStatisticRunner.FINISHED
+        try:
+            with Logger(logger_type) as logger:
+                layout = Layout.from_generator(generator, enable_display=False, depart_from_edge=depart_from_edge)
+                manager = EnsembleRobotManager(robot_type, logger, layout, robot_cnt, replicates,
+                                               depart_from_edge=depart_from_edge, act_after_finding_injury=False)
+                phases = np.full(replicates, SEARCH)
+
+                def log(r, phase, gathered_cnt):
+                    logger.log(i, site_width, site_height, generator.room_cnt, generator.injuries,
+                               'Edge' if depart_from_edge else 'Center', robot_type.__name__, robot_cnt,
+                               phase, *manager.report_layout(r), gathered_cnt, *manager.report_search(r))
+
+                while True:
+                    finished = (phases == SEARCH) & (manager.layout_done |
+                                                     (manager.action_counts >= max_search_action_cnt))
+                    for r in np.flatnonzero(finished):
+                        log(r, 'SearchFinished', 0)
+                    if robot_type != Robot and robot_type != RobotUsingGas:
+                        manager.enter_gathering_mode(finished)
+                        phases[finished] = RETURN
+                        finished = (phases == RETURN) & (manager.missions_complete | (
+                                manager.action_counts - manager.first_injury_action_counts >= max_return_action_cnt))
+                        for r in np.flatnonzero(finished):
+                            log(r, 'ReturnFinished', manager.report_gather(r))
+                    phases[finished] = FINISHED
+                    manager.active = phases != FINISHED
+                    if not manager.active.any():
+                        break
+                    manager.update()
+                    for r in np.flatnonzero(manager.active & (manager.action_counts % 100 == 0)):
+                        if phases[r] == SEARCH:
+                            log(r, 'Search', 0)
+                        else:
+                            log(r, 'Return', manager.report_gather(r))
+        except:
+            with StatisticRunner.lock:
+                if not os.path.exists("debug"):
+                    os.mkdir("debug")
+            with open(f"debug/gen_dbg_{i}.pkl", "wb") as file:
+                pickle.dump(generator, file)
+            import traceback
+            traceback.print_exc()
 
 
 class PerCoverageStatisticRunner(StatisticRunner):
     @staticmethod
     def run(i, site_width, site_height, generator, logger_type, depart_from_edge, robot_type, robot_cnt,
-            max_search_action_cnt, max_return_action_cnt):
+            max_search_action_cnt, max_return_action_cnt, manager_type=RandomSpreadingRobotManager):
         try:
             with Logger(logger_type) as logger:
                 layout = Layout.from_generator(generator, enable_display=False, depart_from_edge=depart_from_edge)
-                manager = RandomSpreadingRobotManager(robot_type, logger, layout, robot_cnt,
-                                                      depart_from_edge=depart_from_edge, act_after_finding_injury=False)
+                manager = manager_type(robot_type, logger, layout, robot_cnt,
+                                       depart_from_edge=depart_from_edge, act_after_finding_injury=False)
                 last_room_visited = 0
                 while not (layout or manager.action_count >= max_search_action_cnt):
                     manager.update()
@@ -145,12 +259,13 @@ class GatheringStatisticRunner(AbstractRunner):
 
     def start(self):
         robot_cnt = 8
+        seeds = random.Random(config.SITE_SEED)
         for i in range(config.MAX_ITER):
             site_width, site_height, room_cnt, injury_cnt, robot_type = 120, 60, 120, 1, RobotUsingGasAndSound
             try:
-                generator = SiteGenerator(site_width, site_height, room_cnt, injury_cnt)
-            except:
-                print(f"Generation {i} failed. Skipped.", file=sys.stderr)
+                generator = SiteGenerator.load_with_retry(site_width, site_height, room_cnt, injury_cnt, seeds)
+            except SiteGenerationError as e:
+                print(f"Generation {i} failed: {e}. Skipped.", file=sys.stderr)
                 continue
             try:
                 layout = Layout.from_generator(generator, enable_display=False, depart_from_edge=False)
@@ -222,7 +337,7 @@ class PresentationRunner(AbstractRunner):
             clock = pygame.time.Clock()
             while not self.should_quit():
                 if not config.PAUSE:
-                    if all(layout.rooms) and all(layout.injuries):  # have been visited and rescued
+                    if layout:  # all rooms and injuries have been visited and rescued
                         config.PAUSE = True
                     layout.update()
                     manager.update()
@@ -281,7 +396,7 @@ class DebugPresentationRunner(AbstractRunner):
         clock = pygame.time.Clock()
         frame_rate = config.DISPLAY_FREQUENCY
         while not self.should_quit():
-            if all(layout.rooms) and all(layout.injuries):  # have been visited and rescued
+            if layout:  # all rooms and injuries have been visited and rescued
                 config.PAUSE = True
             if not config.PAUSE:
                 layout.update()
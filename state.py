@@ -48,8 +48,7 @@ class AbstractState:
 
     def transfer_when_found_injuries(self):
         self.__robot.commit_go_front()
-        self.__robot.mission_complete = True
-        self.__robot.state = self.__robot.found_injury_state
+        self.__robot.complete_mission()
 
     def __str__(self):
         return self.__class__.__name__
@@ -94,5 +93,4 @@ class GatherableAbstractState(AbstractState):
     def transfer_when_finish_gathering(self):
         robot = self.get_robot()
         robot.commit_go_front()
-        robot.mission_complete = True
-        robot.state = robot.found_injury_state
+        robot.complete_mission()
@@ -0,0 +1,110 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import config
+from generator import *
+
+
+@pytest.fixture
+def site_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SITE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "SITE_CACHE", True)
+    SiteGenerator.get_cached.cache_clear()
+    yield tmp_path
+    SiteGenerator.get_cached.cache_clear()
+
+
+@pytest.mark.parametrize("delete_fill", [False, True])
+def test_cache_round_trip(site_cache_dir, delete_fill):
+    arguments = (40, 20, 30, 10, 7, delete_fill)
+    generated = SiteGenerator.load(*arguments)
+    assert not isinstance(generated.site_array, np.memmap)
+    path = SiteGenerator.get_cache_path(*arguments)
+    assert os.path.exists(f"{path}.npy") and os.path.exists(f"{path}.json")
+    expected = SiteGenerator(*arguments[:4], seed=arguments[4], delete_fill=delete_fill)
+    for loaded in (SiteGenerator.load(*arguments), SiteGenerator.get_cached(*arguments)):
+        assert isinstance(loaded.site_array, np.memmap)
+        assert np.array_equal(loaded.site_array, expected.site_array)
+        assert np.array_equal(loaded.grid, expected.grid)
+        assert loaded.site == expected.site
+        for attribute in SiteGenerator.CACHED_ATTRIBUTES:
+            assert getattr(loaded, attribute) == getattr(expected, attribute), attribute
+
+
+def test_get_cached_never_saves(site_cache_dir):
+    generator = SiteGenerator.get_cached(40, 20, 30, 10, 7)
+    assert generator.site_array is not None
+    assert not os.listdir(site_cache_dir)
+
+
+def test_not_generated():
+    generator = SiteGenerator(40, 20, 30, 10, seed=7, generate=False)
+    assert generator.site_array is None and generator.grid is None and generator.room_cnt == 0
+
+
+
+@pytest.mark.parametrize("delete_fill", [False, True])
+def test_pickled_as_arguments(site_cache_dir, delete_fill):
+    generator = SiteGenerator(60, 30, 40, 10, seed=7, delete_fill=delete_fill)
+    payload = pickle.dumps(generator)
+    assert len(payload) < generator.site_array.size
+    unpickled = pickle.loads(payload)
+    assert unpickled is pickle.loads(payload)  # by SiteGenerator.get_cached()
+    assert np.array_equal(unpickled.site_array, generator.site_array)
+    for attribute in SiteGenerator.CACHED_ATTRIBUTES:
+        assert getattr(unpickled, attribute) == getattr(generator, attribute), attribute
+    assert not os.listdir(site_cache_dir)
+
+class BruteForceSiteGenerator(SiteGenerator):
+    """generate_room() as it was before update_edges(), which redetected all the edges of a space each time."""
+
+    def generate_room(self):
+        num = 0
+        black_lists = [[] for _ in range(len(self.spaces))]
+        while num < self.room_num:
+            number = chr(num + ord('A'))
+            if not self.spaces:
+                break
+            i = self.random.randint(0, len(self.spaces) - 1)
+            space = self.spaces[i]
+            up_edge, down_edge, left_edge, right_edge = self.detect_edge(space)
+            all_edges = [edge for edge in up_edge + down_edge + left_edge + right_edge
+                         if edge not in black_lists[i]]
+            if not all_edges:
+                del self.spaces[i]
+                del black_lists[i]
+                continue
+            door = all_edges[self.random.randint(0, len(all_edges) - 1)]
+            outer_door = door[0] == space[0] or door[0] == space[1] or door[1] == space[2] or door[1] == space[3]
+            if door in down_edge:
+                generated = self.generate_upside_room(space, door, number, outer_door)
+            elif door in up_edge:
+                generated = self.generate_downside_room(space, door, number, outer_door)
+            elif door in right_edge:
+                generated = self.generate_leftside_room(space, door, number, outer_door)
+            else:
+                generated = self.generate_rightside_room(space, door, number, outer_door)
+            if generated:
+                num += 1
+            else:
+                black_lists[i].append(door)
+        self.room_cnt = num
+
+
+@pytest.mark.parametrize("size", [(40, 20, 30, 10), (60, 30, 40, 10), (100, 50, 120, 20)])
+def test_update_edges_same_as_brute_force(size):
+    for seed in range(10):
+        try:
+            expected = BruteForceSiteGenerator(*size, seed=seed)
+        except SiteGenerationError as e:
+            with pytest.raises(SiteGenerationError) as error:
+                SiteGenerator(*size, seed=seed)
+            assert (error.value.phase, error.value.cause) == (e.phase, e.cause)
+            continue
+        generator = SiteGenerator(*size, seed=seed)
+        assert np.array_equal(generator.site_array, expected.site_array), seed
+        assert generator.rooms == expected.rooms and generator.room_cnt == expected.room_cnt
+        assert generator.spaces == expected.spaces
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from generator import SiteGenerator
+from layout import *
+from robots.robot import Robot
+
+
+def get_wall_runs_by_scan(is_wall):
+    """The runs of walls as Layout.__init__ used to find them, by walking each row cell by cell."""
+    row_cnt, col_cnt = is_wall.shape
+    runs = []
+    for i in range(row_cnt):
+        wall_start = 0
+        wall_started = False
+        for j in range(col_cnt):
+            if is_wall[i, j]:
+                if not wall_started and j + 1 != col_cnt:
+                    wall_started = True
+            else:
+                if wall_started and wall_start < j - 1:
+                    runs.append([i, wall_start, j - 1])
+                wall_started = False
+                wall_start = j + 1
+        if wall_started and wall_start < col_cnt:
+            runs.append([i, wall_start, col_cnt - 1])
+    return runs
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (1, 2), (3, 1), (5, 7), (20, 40)])
+@pytest.mark.parametrize("density", [0.2, 0.5, 0.8, 1])
+def test_get_wall_runs_random(shape, density):
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        is_wall = rng.random(shape) < density
+        assert Layout.get_wall_runs(is_wall) == get_wall_runs_by_scan(is_wall)
+        assert Layout.get_wall_runs(is_wall.T) == get_wall_runs_by_scan(is_wall.T)
+
+
+@pytest.mark.parametrize("delete_fill", [False, True])
+def test_get_wall_runs_site(delete_fill):
+    for seed in range(5):
+        site = SiteGenerator(60, 30, 40, 10, seed=seed, delete_fill=delete_fill).site_array
+        is_wall = site == ord("%")
+        assert Layout.get_wall_runs(is_wall) == get_wall_runs_by_scan(is_wall)
+        assert Layout.get_wall_runs(is_wall.T) == get_wall_runs_by_scan(is_wall.T)
+
+
+@pytest.fixture(scope="module")
+def layout():
+    return Layout.from_generator(SiteGenerator(60, 30, 40, 10, seed=3), enable_display=False)
+
+
+def get_random_rects(layout, cnt, max_size):
+    rng = np.random.default_rng(0)
+    for x, y, width, height in zip(rng.integers(-max_size, layout.rect.width, cnt),
+                                   rng.integers(-max_size, layout.rect.height, cnt),
+                                   rng.integers(0, max_size, cnt), rng.integers(0, max_size, cnt)):
+        yield pygame.Rect(int(x), int(y), int(width), int(height))
+
+
+def test_sprite_grid_same_as_sprite_collision(layout):
+    sprite = pygame.sprite.Sprite()
+    for sprite.rect in get_random_rects(layout, 2000, int(3 * Wall.SPAN_UNIT)):
+        assert layout.wall_grid.collide_any(sprite.rect) is pygame.sprite.spritecollideany(sprite, layout.walls)
+        assert layout.wall_grid.collide(sprite.rect) == pygame.sprite.spritecollide(sprite, layout.walls, False)
+
+
+def test_visited_places_same_as_sprite_collision():
+    rng = np.random.default_rng(0)
+    robot = SimpleNamespace(radius=Robot.radius, old_rect=pygame.Rect(0, 0, Robot.WIDTH, Robot.WIDTH))
+    places = VisitedPlaces()
+    group = pygame.sprite.Group()
+    found_cnt = 0
+    for step in rng.integers(-4, 5, (3000, 2)):
+        robot.old_rect.center = np.clip(np.add(robot.old_rect.center, step), 0, 200).tolist()
+        found = places.find(robot)
+        expected = pygame.sprite.spritecollideany(VisitedPlace(robot), group, pygame.sprite.collide_circle)
+        assert found == expected and (found is None or found.order == group.sprites().index(expected))
+        found_cnt += found is not None
+        if rng.random() < 0.5:
+            places.add(robot)
+            group.add(VisitedPlace(robot))
+    assert len(places) == len(group) and 0 < found_cnt < 3000
+
+
+def test_entered_areas_same_as_sprite_collision(layout):
+    sprite = pygame.sprite.Sprite()
+    entered_cnt = 0
+    for sprite.rect in get_random_rects(layout, 2000, Robot.WIDTH * 2):
+        entered_rooms, entered_injuries = layout.get_entered_areas(sprite.rect)
+        assert entered_rooms == pygame.sprite.spritecollide(sprite, layout.rooms, False)
+        assert entered_injuries == pygame.sprite.spritecollide(sprite, layout.injuries, False)
+        entered_cnt += len(entered_rooms) + len(entered_injuries)
+    assert entered_cnt > 0
+
+
+def test_nearest_door_same_as_min(layout):
+    rng = np.random.default_rng(0)
+    for position in zip(rng.integers(0, layout.rect.width, 2000).tolist(),
+                        rng.integers(0, layout.rect.height, 2000).tolist()):
+        assert layout.get_nearest_door(position) is min(
+            layout.doors, key=lambda d: utils.pygame_cartesian_diff_vec(position, d.position).length())
+    assert 0 < sum(map(len, layout.door_candidates.values())) < len(layout.door_candidates) * len(layout.doors)
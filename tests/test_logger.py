@@ -0,0 +1,80 @@
+import csv
+import sqlite3
+
+import numpy as np
+import pytest
+
+import config
+import db_to_csv
+import merge_shards
+from logger import *
+
+
+@pytest.fixture
+def result_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "RESULT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def make_rows():
+    """Rows with their robots as rows of (visits, rescues, collides), and the run-level items of a short row."""
+    attributes = AbstractLogger.get_attributes_with_type()
+    run_items = [k if attribute_type == "INT" else f"{attribute}{k}"
+                 for k, (attribute, attribute_type) in enumerate(list(attributes.items())[:-1])]
+    robots = [np.array([[3, 1, 7]]), np.arange(30).reshape(10, 3),
+              np.array([[2 ** 31 - 1, 0, 5], [0, 0, 0]])]
+    return [(tuple(run_items), robots) for robots in robots], tuple(run_items[:9])
+
+
+def test_pack_row_round_trip(result_dir):
+    rows, short_row = make_rows()
+    logger = SQLite3Logger(reset=True)
+    for run_items, robots in rows:
+        logger.log(*run_items, *robots.ravel().tolist())
+    logger.log(*run_items)  # without robots
+    logger.log(*short_row)
+    logger.flush()
+    with sqlite3.connect(f"{result_dir}/results.db") as connection:
+        logged = connection.execute(f"SELECT {','.join(logger.attributes)} FROM results;").fetchall()
+    assert len(logged) == len(rows) + 2
+    for (run_items, robots), row in zip(rows, logged):
+        assert row[:-1] == run_items
+        assert np.array_equal(AbstractLogger.unpack_robots(row[-1]), robots)
+    assert logged[-2][:-1] == rows[-1][0]
+    assert logged[-1][:len(short_row)] == short_row
+    assert logged[-2][-1] is None and logged[-1][-1] is None
+
+
+def test_export_robots(result_dir):
+    rows, _ = make_rows()
+    logger = SQLite3Logger(reset=True)
+    for run_items, robots in rows:
+        logger.log(*run_items, *robots.ravel().tolist())
+    logger.flush()
+    assert db_to_csv.export(LoggerType.SQLite3, "exported") == len(rows)
+    with open(f"{result_dir}/exported.csv", encoding="utf-8", newline="") as file:
+        exported = list(csv.reader(file))
+    assert tuple(exported[0]) == logger.attributes
+    for (_, robots), row in zip(rows, exported[1:]):
+        assert row[-1] == " ".join(map(str, robots.ravel().tolist()))
+
+
+def test_shard_round_trip(result_dir, monkeypatch):
+    monkeypatch.setattr(config, "SHARD_DIR", f"{result_dir}/shards")
+    monkeypatch.setattr(config, "COLUMN_DIR", f"{result_dir}/columns")
+    rows, short_row = make_rows()
+    logger = ShardLogger(reset=True)
+    logged_robots = []
+    for chunk in range(2):
+        for run_items, robots in rows:
+            logger.log(*run_items, *(robots - chunk).ravel().tolist())
+            logged_robots.append(robots - chunk)
+        logger.log(*short_row)
+        logged_robots.append(np.empty((0, 3), dtype=np.int32))
+        logger.flush()
+    assert merge_shards.merge_shards(config.SHARD_DIR, config.COLUMN_DIR) == len(logged_robots)
+    columns = merge_shards.load_columns(config.COLUMN_DIR)
+    split = ShardLogger.split_robots(columns["robots"], columns["robots_offset"])
+    assert len(split) == len(logged_robots)
+    for robots, logged in zip(split, logged_robots):
+        assert np.array_equal(robots, logged)
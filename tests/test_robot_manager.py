@@ -0,0 +1,30 @@
+import numpy as np
+import pygame
+
+from robot_manager import *
+
+
+def test_robot_group_same_as_all_robots():
+    rng = np.random.default_rng(0)
+    robots = RobotGroup()
+    for x, y in rng.integers(0, 10 * Robot.WIDTH, (60, 2)).tolist():
+        robot = pygame.sprite.Sprite()
+        robot.radius = Robot.radius
+        robot.mission_complete = False
+        robot.rect = pygame.Rect(0, 0, Robot.WIDTH, Robot.WIDTH)
+        robot.rect.center = x, y
+        robots.add(robot)
+    colliding_cnt = 0
+    for frame in range(50):
+        for robot in robots.sprites():
+            robot.rect.move_ip(*rng.integers(-Robot.WIDTH, Robot.WIDTH + 1, 2).tolist())
+            robots.place(robot)
+            expected = [other for other in robots if other != robot and pygame.sprite.collide_circle(other, robot)]
+            colliding = [other for other in robots.get_neighbours(robot.rect.center)
+                         if other != robot and pygame.sprite.collide_circle(other, robot)]
+            assert set(colliding) == set(expected)
+            colliding_cnt += len(expected)
+        if frame % 10 == 9:
+            robots.remove(robots.sprites()[0])
+            assert sum(map(len, robots.cells.values())) == len(robots)
+    assert colliding_cnt > 0
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from compare_engines import simulate
+from generator import SiteGenerator
+from robot_manager import RandomSpreadingRobotManager
+from vectorized_robot_manager import *
+
+
+@pytest.fixture(scope="module")
+def generator():
+    return SiteGenerator(60, 30, 30, 10, seed=3)
+
+
+@pytest.mark.parametrize("robot_type", EnsembleRobotManager.SUPPORTED_TYPES, ids=lambda t: t.__name__)
+@pytest.mark.parametrize("robot_cnt", [1, 4, 10])
+@pytest.mark.parametrize("depart_from_edge", [False, True], ids=["center", "edge"])
+def test_same_as_sprites(generator, robot_type, robot_cnt, depart_from_edge):
+    reports = [simulate(manager_type, generator, robot_type, robot_cnt, depart_from_edge, 7, 1000, 250)[0]
+               for manager_type in (RandomSpreadingRobotManager, VectorizedRobotManager)]
+    assert reports[0] == reports[1]
+
+
+@pytest.mark.parametrize("robot_type", EnsembleRobotManager.SUPPORTED_TYPES, ids=lambda t: t.__name__)
+def test_same_as_sprites_with_cell_list(generator, robot_type):
+    robot_cnt = EnsembleRobotManager.PAIRWISE_COLLISION_MAX_CNT + 22
+    reports = [simulate(manager_type, generator, robot_type, robot_cnt, False, 7, 300, 100)[0]
+               for manager_type in (RandomSpreadingRobotManager, VectorizedRobotManager)]
+    assert reports[0] == reports[1]
+
+
+def test_random_draws():
+    draws = RandomDraws(random.Random(5), 64)
+    expected = random.Random(5)
+    start = 0
+    for _ in range(8):
+        word = draws.next_choice[start]
+        assert draws.choices[word] == expected.choice((0, 1))
+        word = draws.next_azimuth[word + 1]
+        assert draws.azimuths[word] == expected.randint(-179, 180)
+        start = word + 1
+    draws.consume(start)
+    assert draws.rng.random() == expected.random()
+
+
+def test_supports():
+    assert VectorizedRobotManager.supports(Robot)
+    assert not VectorizedRobotManager.supports(RobotUsingGas, EnsembleRobotManager.MIN_ROBOT_CNT - 1)
+    assert VectorizedRobotManager.supports(RobotUsingGas, EnsembleRobotManager.MIN_ROBOT_CNT)
+    assert not VectorizedRobotManager.supports(GatherableRobot)
+
+
+@pytest.mark.parametrize("robot_type", [Robot, RobotUsingGas], ids=lambda t: t.__name__)
+@pytest.mark.parametrize("depart_from_edge", [False, True], ids=["center", "edge"])
+def test_ensemble_same_as_sprites(generator, robot_type, depart_from_edge):
+    """Replicate r spawns from the random state after the initial biases of the replicates before it."""
+    robot_cnt, replicates, frame_cnt = 6, 4, 400
+    random.seed(7)
+    layout = Layout.from_generator(generator, enable_display=False, depart_from_edge=depart_from_edge)
+    ensemble = EnsembleRobotManager(robot_type, None, layout, robot_cnt, replicates,
+                                    depart_from_edge=depart_from_edge)
+    for _ in range(frame_cnt):
+        ensemble.update()
+    for r in range(replicates):
+        random.seed(7)
+        for _ in range(r):
+            random.randint(-179, 180)
+        layout = Layout.from_generator(generator, enable_display=False, depart_from_edge=depart_from_edge)
+        manager = RandomSpreadingRobotManager(robot_type, None, layout, robot_cnt, depart_from_edge=depart_from_edge)
+        for _ in range(frame_cnt):
+            manager.update()
+        assert ensemble.report_layout(r) == layout.report()
+        assert ensemble.report_search(r) == manager.report_search()
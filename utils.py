@@ -109,6 +109,25 @@ def azimuth_to_direction(azimuth):
         return Direction.WEST
 
 
+# Integer azimuths of the lookup tables, so that table[azimuth] works for any azimuth in (-180, 360)
+# (negative ones are wrapped around by Python indexing).
+__TABLE_AZIMUTHS = list(range(360)) + list(range(-180, 0))
+
+# azimuth_to_direction() of every integer azimuth, e.g., AZIMUTH_DIRECTIONS[azimuth].
+AZIMUTH_DIRECTIONS = tuple(azimuth_to_direction(normalize_azimuth(azimuth)) for azimuth in __TABLE_AZIMUTHS)
+
+
+def get_polar_offset_table(distance, *, truncate=False):
+    """
+    polar_to_pygame_cartesian(distance, azimuth) of every integer azimuth, e.g., table[azimuth].
+    If truncate, offsets are truncated to ints like pygame.Rect.move_ip() does.
+    """
+    offsets = (polar_to_pygame_cartesian(distance, azimuth) for azimuth in __TABLE_AZIMUTHS)
+    if truncate:
+        return tuple((int(dx), int(dy)) for dx, dy in offsets)
+    return tuple(offsets)
+
+
 def direction_to_azimuth(direction):
     if direction == Direction.EAST:
         return 0
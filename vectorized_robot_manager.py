@@ -0,0 +1,747 @@
+import random
+
+import numpy as np
+
+import utils
+from layout import *
+from robot_manager import SPAWN_OFFSETS
+from robots.random_robot import RandomRobot
+from robots.robot import Robot, GatherableRobot
+from robots.robot_using_gas import RobotUsingGas
+
+JUST_STARTED, FOLLOWING_WALL, GATHERING, FOUND_INJURY = range(4)
+EAST, NORTH, WEST, SOUTH = range(4)
+TURN_NONE, TURN_RIGHT, TURN_LEFT = 0, 1, -1
+
+__direction_codes = {Direction.EAST: EAST, Direction.NORTH: NORTH, Direction.WEST: WEST, Direction.SOUTH: SOUTH}
+# Indexed by azimuth % 360, i.e., by any azimuth in (-180, 180] using negative indices.
+AZIMUTH_DIRECTIONS = np.array([__direction_codes[utils.AZIMUTH_DIRECTIONS[utils.normalize_azimuth(azimuth)]]
+                               for azimuth in range(360)], dtype=np.int8)
+STEP_OFFSETS = np.array([Robot.STEP_OFFSETS[utils.normalize_azimuth(azimuth)] for azimuth in range(360)],
+                        dtype=np.int64)
+
+
+def normalize_azimuths(azimuths):
+    """Vectorized utils.normalize_azimuth()."""
+    return (azimuths + 179) % 360 - 179
+
+
+NEVER_COLLIDING_RECT = (np.iinfo(np.int64).max, np.iinfo(np.int64).max, np.iinfo(np.int64).min, np.iinfo(np.int64).min)
+
+
+def get_rect_array(rects):
+    """Rects as rows of (left, top, right, bottom). Empty rects, which never collide in pygame, never collide here."""
+    return np.array([(r.left, r.top, r.right, r.bottom) if r.width > 0 and r.height > 0 else NEVER_COLLIDING_RECT
+                     for r in rects], dtype=np.int64).reshape(-1, 4)
+
+
+def collide_rects(xy, width, rects):
+    """Like pygame.Rect.colliderect() between squares at xy of the width and rects from get_rect_array()."""
+    return (xy[..., 0, None] < rects[..., 2]) & (rects[..., 0] < xy[..., 0, None] + width) & \
+        (xy[..., 1, None] < rects[..., 3]) & (rects[..., 1] < xy[..., 1, None] + width)
+
+
+class LayoutArrays:
+    """Static geometry of a layout as NumPy arrays, which can be shared by all the swarms stepped on it."""
+
+    def __init__(self, layout: Layout):
+        self.layout = layout
+
+        self.walls = layout.wall_grid.sprites
+        self.wall_indices = {id(wall): i for i, wall in enumerate(self.walls)}
+        self.wall_rects = get_rect_array(wall.rect for wall in self.walls)
+        self.wall_cell_size = layout.wall_grid.cell_size
+        rows = layout.rect.height // self.wall_cell_size + 1
+        cols = layout.rect.width // self.wall_cell_size + 1
+        depth = max((len(indices) for indices in layout.wall_grid.cells.values()), default=1)
+        self.wall_candidates = np.full((rows, cols, depth), -1, dtype=np.int32)  # wall indices of each cell
+        for (x, y), indices in layout.wall_grid.cells.items():
+            if 0 <= x < cols and 0 <= y < rows:
+                self.wall_candidates[y, x, :len(indices)] = indices
+
+        # Areas are indexed by 1..room_cnt for rooms and room_cnt + 1..room_cnt + injury_cnt for injuries.
+        self.areas = [None] + layout.room_list + layout.injury_list
+        self.room_cnt = len(layout.room_list)
+        self.area_rects = get_rect_array([pygame.Rect(0, 0, 0, 0)] + [area.rect for area in self.areas[1:]])
+        self.area_raster = np.where(layout.area_raster < 0, self.room_cnt - layout.area_raster.astype(np.int32),
+                                    layout.area_raster)
+
+        self.departure_position = np.array(layout.departure_place.rect.center, dtype=np.float64)
+        self.departure_radius = layout.departure_place.radius
+        self.trail_cell_size = VisitedPlace.CELL_SIZE
+        self.trail_shape = (layout.rect.height // self.trail_cell_size + 1,
+                            layout.rect.width // self.trail_cell_size + 1)
+
+    @staticmethod
+    def get_cells(xy, width, cell_size, shape):
+        """Cells covered by squares at xy of the width, and whether they are valid. Returns (rows, cols, valid)."""
+        first = np.floor_divide(xy, cell_size).astype(np.int64)
+        last = np.floor_divide(xy + width - 1, cell_size).astype(np.int64)
+        span = np.arange(int((width - 1) // cell_size) + 2)
+        cols = first[:, 0, None] + span
+        rows = first[:, 1, None] + span
+        valid_cols = (cols <= last[:, 0, None]) & (cols >= 0) & (cols < shape[1])
+        valid_rows = (rows <= last[:, 1, None]) & (rows >= 0) & (rows < shape[0])
+        valid = valid_rows[:, :, None] & valid_cols[:, None, :]
+        return np.minimum(np.maximum(rows, 0), shape[0] - 1), np.minimum(np.maximum(cols, 0), shape[1] - 1), valid
+
+    def collide_walls(self, xy, width):
+        """Index of the first wall colliding each square at xy of the width, or -1, like Layout.wall_grid."""
+        rows, cols, valid = self.get_cells(xy, width, self.wall_cell_size, self.wall_candidates.shape)
+        candidates = self.wall_candidates[rows[:, :, None], cols[:, None, :]]
+        candidates = np.where(valid[..., None], candidates, -1).reshape(len(xy), -1)
+        hit = (candidates >= 0) & collide_rects(xy, width, self.wall_rects[candidates])  # -1 is masked out
+        first = np.where(hit, candidates, len(self.walls)).min(axis=1, initial=len(self.walls))
+        return np.where(first == len(self.walls), -1, first)
+
+    def collide_areas(self, xy, width):
+        """Area indices under each square at xy of the width, and whether they are really entered."""
+        rows, cols, valid = self.get_cells(xy, width, Wall.SPAN_UNIT, self.area_raster.shape)
+        areas = np.where(valid, self.area_raster[rows[:, :, None], cols[:, None, :]], 0).reshape(len(xy), -1)
+        return areas, collide_rects(xy, width, self.area_rects[areas])
+
+
+class Trails:
+    """
+    Gas trails of replicates as NumPy arrays, each of which behaves like layout.VisitedPlaces.
+    Places are numbered in marking order, so the earliest one has the smallest number,
+    and each cell of each replicate lists the places marked in it.
+    """
+
+    def __init__(self, arrays: LayoutArrays, replicates):
+        self.cell_size = arrays.trail_cell_size
+        self.shape = arrays.trail_shape
+        self.size = self.shape[0] * self.shape[1]
+        self.radius = Robot.radius // 3  # of VisitedPlace
+        self.reach = max(-(-2 * self.radius // self.cell_size), 1)  # cells to search around, like VisitedPlaces
+        self.cells = np.full((replicates * self.size, 2), -1, dtype=np.int32)  # places of each cell, -1 if none
+        self.cell_counts = np.zeros(replicates * self.size, dtype=np.int32)
+        self.positions = np.empty((1024, 2), dtype=np.int64)
+        self.visit_counts = np.empty(1024, dtype=np.int64)
+        self.markers = np.empty(1024, dtype=np.int64)  # robots which marked the places
+        self.cnt = 0
+
+    def get_cells(self, replicates, centers, dx=0, dy=0):
+        cells = np.floor_divide(centers, self.cell_size)
+        rows = np.minimum(np.maximum(cells[:, 1] + dy, 0), self.shape[0] - 1)
+        cols = np.minimum(np.maximum(cells[:, 0] + dx, 0), self.shape[1] - 1)
+        return replicates * self.size + rows * self.shape[1] + cols
+
+    def add(self, robots, replicates, centers):
+        """Like VisitedPlaces.add() of the robots, which are given in robot order, marking their centers."""
+        if len(robots) == 0:
+            return
+        cells = self.get_cells(replicates, centers)
+        slots = self.cells[cells]
+        marked = ((slots >= 0) & (self.positions[np.maximum(slots, 0)] == centers[:, None]).all(axis=2)).any(axis=1)
+        xy = centers - centers.min(axis=0)
+        span = xy.max(axis=0) + 1
+        new = np.zeros(len(robots), dtype=bool)
+        new[np.unique((replicates * span[1] + xy[:, 1]) * span[0] + xy[:, 0], return_index=True)[1]] = True
+        new &= ~marked  # and first at the position in robot order
+        robots, cells, centers = robots[new], cells[new], centers[new]
+        cnt = len(robots)
+        if cnt == 0:
+            return
+        if self.cnt + cnt > len(self.markers):
+            capacity = max(2 * len(self.markers), self.cnt + cnt)
+            self.positions = np.resize(self.positions, (capacity, 2))
+            self.visit_counts = np.resize(self.visit_counts, capacity)
+            self.markers = np.resize(self.markers, capacity)
+        places = np.arange(self.cnt, self.cnt + cnt)
+        self.positions[places] = centers
+        self.visit_counts[places] = 0
+        self.markers[places] = robots
+        self.cnt += cnt
+
+        # Places marked in the same cell at once take the free slots in order.
+        order = np.argsort(cells, kind="stable")
+        sorted_cells = cells[order]
+        starts = np.flatnonzero(np.concatenate(([True], sorted_cells[1:] != sorted_cells[:-1])))
+        ranks = np.empty(cnt, dtype=np.int64)
+        ranks[order] = np.arange(cnt) - np.repeat(starts, np.diff(np.append(starts, cnt)))
+        slots = self.cell_counts[cells] + ranks
+        depth = self.cells.shape[1]
+        if slots.max() >= depth:
+            self.cells = np.pad(self.cells, ((0, 0), (0, max(2 * depth, slots.max() + 1) - depth)),
+                                constant_values=-1)
+        self.cells[cells, slots] = places
+        np.add.at(self.cell_counts, cells, 1)
+
+    def find(self, robots, replicates, centers, first_new):
+        """
+        Like VisitedPlaces.find() of the robots at their centers. Places from first_new on have been marked
+        in the current frame, and are only seen by the robots after the ones which marked them.
+        Returns the places found, or -1.
+        """
+        if len(robots) == 0:
+            return np.empty(0, dtype=np.int64)
+        span = range(-self.reach, self.reach + 1)
+        candidates = np.concatenate([self.cells[self.get_cells(replicates, centers, dx, dy)]
+                                     for dx in span for dy in span], axis=1)
+        places = np.maximum(candidates, 0)
+        diff = self.positions[places] - centers[:, None]
+        hit = (candidates >= 0) & (np.einsum("ijk,ijk->ij", diff, diff) <= (2 * self.radius) ** 2) & \
+            ((places < first_new) | (self.markers[places] < robots[:, None]))
+        found = np.where(hit, places, self.cnt).min(axis=1, initial=self.cnt)
+        return np.where(found == self.cnt, -1, found)
+
+    def visit(self, finding, found, checking, checked):
+        """
+        Counts a visit to each place found by the finding robots, and resets the visit counts of at least 3
+        checked by the checking robots, one robot after another like RobotUsingGas does.
+        Returns whether each checking robot has reset the count.
+        """
+        reset = np.zeros(len(checking), dtype=bool)
+        if len(finding) == 0 and len(checking) == 0:
+            return reset
+        robots = np.concatenate((finding, checking))
+        order = np.argsort(robots, kind="stable")
+        places = np.concatenate((found, checked))[order].tolist()
+        checks = np.concatenate((np.full(len(finding), -1), np.arange(len(checking))))[order].tolist()
+        for place, check in zip(places, checks):
+            if check < 0:
+                self.visit_counts[place] += 1
+            elif self.visit_counts[place] >= 3:
+                self.visit_counts[place] = 0
+                reset[check] = True
+        return reset
+
+
+class RandomDraws:
+    """
+    The next cnt words of rng, a random.Random or the random module, drawn at once and decoded into the draws of
+    randint(-179, 180) and choice() of 2 items. Both are rejection sampling on getrandbits() of 9 and 2 bits,
+    i.e., on the top bits of a 32-bit word, so a draw is the first word at or after where it starts that is accepted.
+    """
+
+    def __init__(self, rng, cnt):
+        self.rng = rng
+        self.state = rng.getstate()
+        self.cnt = cnt
+        words = np.frombuffer(rng.getrandbits(32 * cnt).to_bytes(4 * cnt, "little"), dtype="<u4").astype(np.int64)
+        self.azimuths = (words >> 23) - 179
+        self.choices = np.append(words >> 30, 0).tolist()
+        self.next_azimuth = self.get_next(words >> 23 < 360).tolist()
+        self.next_choice = self.get_next(words >> 30 < 2).tolist()
+
+    def get_next(self, accepted):
+        """Index of the first accepted word at or after each index, and cnt if there is none, also past the end."""
+        indices = np.where(accepted, np.arange(self.cnt), self.cnt)
+        return np.append(np.minimum.accumulate(indices[::-1])[::-1], (self.cnt, self.cnt))
+
+    def consume(self, cnt):
+        """Leaves rng as if only the first cnt words had been drawn."""
+        self.rng.setstate(self.state)
+        if cnt:
+            self.rng.getrandbits(32 * cnt)
+
+    @staticmethod
+    def match_random():
+        """Whether the draws are those of random.Random in this Python, which is checked on a few of them."""
+        draws = RandomDraws(random.Random(0), 256)
+        expected = random.Random(0)
+        start = 0
+        for k in range(32):
+            if k % 3:
+                word = draws.next_azimuth[start]
+                if word == draws.cnt or draws.azimuths[word] != expected.randint(-179, 180):
+                    return False
+            else:
+                word = draws.next_choice[start]
+                if word == draws.cnt or draws.choices[word] != expected.choice((0, 1)):
+                    return False
+            start = word + 1
+        return True
+
+
+class EnsembleRobotManager:
+    """
+    Robot manager that keeps positions, azimuths, FSM states and counters as NumPy arrays,
+    and steps independent replicates of a swarm on the same layout in lock-step with batched array operations
+    instead of one sprite per robot. Replicate r consists of robots r * amount ... (r + 1) * amount - 1,
+    which only collide with each other and keep their own visited areas and trails, so the layout's sprites are
+    left untouched. Replicates can be frozen by clearing their flags in active.
+    Supports Robot, RobotUsingGas and RandomRobot, which are spawned like RandomSpreadingRobotManager does.
+
+    NOTE: Like the sprite managers, the robots of a replicate are updated one after another, i.e., a robot sees
+          the robots before it where they have moved to and the others where they were, and RandomRobot draws from
+          random (or random.Random(seed)) in the same order. So a replicate is the same as the sprite simulation
+          started from the same random state, see compare_engines.py.
+    """
+
+    # RandomRobot needs RandomDraws to draw like random, which relies on how random.Random draws integers.
+    SUPPORTED_TYPES = (Robot, RobotUsingGas, RandomRobot) if RandomDraws.match_random() else (Robot, RobotUsingGas)
+    PAIRWISE_COLLISION_MAX_CNT = 128  # a cell list is used for larger swarms
+    # Robots of all the replicates below which the sprite managers are faster, measured on small sites:
+    # the break-even is about 30 robots for a single swarm and 40 to 60 in total for replicates.
+    MIN_ROBOT_CNT = 48
+
+    def __init__(self, robot_type, logger, background, amount, replicates=1, *,
+                 depart_from_edge=False, act_after_finding_injury=False, seed=None, arrays=None):
+        if not self.supports(robot_type):
+            raise Exception(f"{robot_type.__name__} is not supported by {self.__class__.__name__}!")
+        if act_after_finding_injury:
+            raise Exception(f"{self.__class__.__name__} does not support acting after finding injuries!")
+        self.robot_type = robot_type
+        self.logger = logger
+        self.background: Layout = background
+        self.arrays = LayoutArrays(background) if arrays is None else arrays
+        self.random = random if seed is None else random.Random(seed)
+        self.depart_from_edge = depart_from_edge
+        self.act_after_finding_injury = act_after_finding_injury
+        self.is_random = robot_type == RandomRobot
+        self.uses_gas = robot_type == RobotUsingGas
+        self.amount = amount  # per replicate
+        self.replicates = replicates
+
+        self.replicate = np.repeat(np.arange(replicates), amount)
+        self.active = np.ones(replicates, dtype=bool)
+        self.action_counts = np.zeros(replicates, dtype=np.int64)
+        self.first_injury_action_counts = np.zeros(replicates, dtype=np.int64)
+        self.last_just_start_counts = np.zeros(replicates, dtype=np.int64)
+        self.last_following_wall_counts = np.zeros(replicates, dtype=np.int64)
+
+        self.position = np.empty((0, 2), dtype=np.float64)
+        self.azimuth = np.empty(0, dtype=np.int64)
+        for _ in range(replicates):
+            self.spawn(self.background.departure_position)
+        self.xy = np.trunc(self.position - Robot.radius).astype(np.int64)  # topleft of the rect
+        self.original_azimuth = self.azimuth.copy()
+        robot_cnt = len(self.replicate)
+        self.state = np.full(robot_cnt, JUST_STARTED, dtype=np.int8)
+        self.collide_turn = np.full(robot_cnt, TURN_NONE, dtype=np.int8)
+        self.just_followed_wall = np.full(robot_cnt, -1, dtype=np.int64)
+        self.just_visited_place = np.full(robot_cnt, -1, dtype=np.int64)
+        self.in_room = np.zeros(robot_cnt, dtype=bool)
+        self.mission_complete = np.zeros(robot_cnt, dtype=bool)
+        self.colliding_others_count = np.zeros(robot_cnt, dtype=np.int64)
+        self.visit_room_count = np.zeros(robot_cnt, dtype=np.int64)
+        self.rescue_count = np.zeros(robot_cnt, dtype=np.int64)
+
+        self.area_done = np.zeros((replicates, len(self.arrays.areas)), dtype=bool)
+        self.visited_room_counts = np.zeros(replicates, dtype=np.int64)
+        self.rescued_injury_counts = np.zeros(replicates, dtype=np.int64)
+        self.trails = Trails(self.arrays, replicates) if self.uses_gas else None
+
+    @classmethod
+    def supports(cls, robot_type, robot_cnt=None):
+        """
+        Whether robot_type can be simulated, and if robot_cnt, the robots of all the replicates, is given,
+        whether it is simulated faster than by the sprite managers.
+        """
+        return robot_type in cls.SUPPORTED_TYPES and (robot_cnt is None or robot_cnt >= cls.MIN_ROBOT_CNT)
+
+    def spawn(self, position):
+        """Appends the robots of a replicate."""
+        initial_bias = self.random.randint(-179, 180)
+        delta = (180 if self.depart_from_edge else 360) // self.amount
+        positions = []
+        azimuths = []
+        for i in range(self.amount):
+            azimuth = utils.normalize_azimuth(initial_bias + i * delta)
+            if azimuth < 0:
+                azimuth += 360  # OK
+            dx, dy = SPAWN_OFFSETS[azimuth]
+            positions.append((position[0] + dx, position[1] + dy))
+            azimuths.append(utils.normalize_azimuth(int(azimuth)))
+        self.position = np.concatenate((self.position, np.array(positions, dtype=np.float64).reshape(-1, 2)))
+        self.azimuth = np.concatenate((self.azimuth, np.array(azimuths, dtype=np.int64)))
+
+    def update(self):
+        """Steps the robots of all active replicates by one frame."""
+        self.action_counts += self.active
+        active = self.active[self.replicate]
+        new_xy = self.xy + STEP_OFFSETS[self.azimuth % 360]
+        wall = np.where(active, self.arrays.collide_walls(new_xy, Robot.WIDTH), -1)
+        if self.is_random:
+            self.update_random_robots(new_xy, wall >= 0, active)
+        else:
+            self.update_bug_robots(new_xy, wall, active)
+        self.update_areas(active)
+
+    def get_collisions(self, new_xy, checking, moving, may_move):
+        """
+        Robot-robot collisions of the checking robots at new_xy, like Robot.is_colliding_another_robot() in robot
+        order: a robot sees the robots before it where they have moved to if they move, which is certain for
+        moving and decided in robot order for may_move, and the others where they are.
+        Returns (hit, i, j, at_new_xy), where hit is whether each robot collides regardless of how the robots
+        before it move, and robot i of each pair collides robot j if whether j moves is at_new_xy.
+        Pairs are only given for the robots not hit.
+        """
+        distance = (2 * Robot.radius) ** 2
+        movable = moving | may_move
+        hit = np.zeros(len(self.xy), dtype=bool)
+        pairs = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=bool))]
+
+        def classify(i, j, responsible):
+            """
+            Settles the candidates (i, j) whose robot j collides wherever it is, and keeps those colliding at
+            only one of its positions as pairs, from the responsible candidates so that each pair is kept once.
+            """
+            diff = new_xy[i] - self.xy[j]
+            close = np.einsum("ij,ij->i", diff, diff) <= distance
+            diff = new_xy[i] - new_xy[j]
+            close_to_new_xy = np.einsum("ij,ij->i", diff, diff) <= distance
+            before = j < i
+            settled = np.where(before & moving[j], close_to_new_xy,
+                               np.where(before & may_move[j], close & close_to_new_xy, close))
+            hit[i[settled]] = True
+            pending = before & may_move[j] & (close != close_to_new_xy) & responsible(close_to_new_xy)
+            pairs.append((i[pending], j[pending], close_to_new_xy[pending]))
+
+        if self.amount <= self.PAIRWISE_COLLISION_MAX_CNT:
+            new = new_xy.reshape(self.replicates, self.amount, 1, 2)
+            close = np.zeros((self.replicates, self.amount, self.amount), dtype=bool)
+            for xy in (self.xy, new_xy):
+                diff = new - xy.reshape(self.replicates, 1, self.amount, 2)
+                close |= np.einsum("rijk,rijk->rij", diff, diff) <= distance
+            close &= checking.reshape(self.replicates, self.amount, 1)
+            close[:, np.arange(self.amount), np.arange(self.amount)] = False
+            r, i, j = np.nonzero(close)
+            classify(r * self.amount + i, r * self.amount + j, lambda close_to_new_xy: True)
+        else:
+            # Cell list of where the robots may be, whose cells are the collision distance wide. A robot is done
+            # with its candidates once it is hit, so it takes a few of them at a time, twice as many each round.
+            robots = np.flatnonzero(checking)
+            moved = np.flatnonzero(movable)
+            candidates = np.concatenate((np.arange(len(self.xy)), moved))
+            at_new_xy = np.concatenate((np.zeros(len(self.xy), dtype=bool), np.ones(len(moved), dtype=bool)))
+            cells = np.floor_divide(np.concatenate((self.xy, new_xy[moved])), 2 * Robot.radius)
+            queries = np.floor_divide(new_xy[robots], 2 * Robot.radius)
+            origin = np.minimum(cells.min(axis=0), queries.min(axis=0, initial=0)) - 1
+            shape = np.maximum(cells.max(axis=0), queries.max(axis=0, initial=0)) - origin + 2  # (cols, rows)
+            cells -= origin
+            queries -= origin
+            keys = (self.replicate[candidates] * shape[1] + cells[:, 1]) * shape[0] + cells[:, 0]
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            neighbours = ((self.replicate[robots] * shape[1] + queries[:, 1]) * shape[0] + queries[:, 0])[:, None] + \
+                np.array([dy * shape[0] + dx for dy in (-1, 0, 1) for dx in (-1, 0, 1)])
+            starts = np.searchsorted(sorted_keys, neighbours, "left")
+            counts = np.searchsorted(sorted_keys, neighbours, "right") - starts
+            ends = np.cumsum(counts, axis=1)  # of the cells in the candidates of a robot, the 9 cells one after another
+            starts -= ends - counts  # so that the k-th candidate in a cell is order[starts + k]
+            rows = np.flatnonzero(ends[:, -1])
+            first, cnt = 0, 8
+            while len(rows):
+                k = np.arange(first, first + cnt)
+                valid = k < ends[rows, -1, None]
+                cell = np.minimum((ends[rows, None, :] <= k[:, None]).sum(axis=2), 8)
+                entries = order[np.where(valid, starts[rows[:, None], cell] + k, 0)]
+                i = np.broadcast_to(robots[rows, None], entries.shape)
+                j = candidates[entries]
+                valid &= i != j
+                entry_at_new_xy = at_new_xy[entries][valid]
+                classify(i[valid], j[valid], lambda close_to_new_xy: close_to_new_xy == entry_at_new_xy)
+                first += cnt
+                cnt *= 2
+                rows = rows[~hit[robots[rows]] & (ends[rows, -1] > first)]
+        i, j, at_new_xy = (np.concatenate(arrays) for arrays in zip(*pairs))
+        pending = ~hit[i]
+        return hit, i[pending], j[pending], at_new_xy[pending]
+
+    def collide_robots(self, new_xy, checking):
+        """
+        Like Robot.is_colliding_another_robot() (without counting) of the checking robots at new_xy,
+        each of which moves there unless colliding, in robot order.
+        """
+        hit, i, j, at_new_xy = self.get_collisions(new_xy, checking, np.zeros_like(checking), checking)
+        if len(i) == 0:
+            return hit
+        order = np.argsort(i, kind="stable")
+        i, j, at_new_xy = i[order].tolist(), j[order].tolist(), at_new_xy[order].tolist()
+        hit = hit.tolist()
+        for pair, robot in enumerate(i):  # in robot order, so the robots before have been settled
+            if not hit[robot] and at_new_xy[pair] != hit[j[pair]]:  # the robot before has moved unless hit
+                hit[robot] = True
+        return np.array(hit)
+
+    def commit(self, mask, new_xy):
+        self.xy[mask] = new_xy[mask]
+        self.position[mask] = new_xy[mask] + Robot.radius
+
+    def is_moving_along_wall(self, new_xy):
+        has_wall = self.just_followed_wall >= 0
+        wall = self.arrays.wall_rects[np.where(has_wall, self.just_followed_wall, 0)]
+        distances = np.empty((len(self.xy), 4), dtype=np.int64)  # indexed by direction codes
+        distances[:, EAST] = new_xy[:, 0] - wall[:, 2]
+        distances[:, NORTH] = wall[:, 1] - (new_xy[:, 1] + Robot.WIDTH)
+        distances[:, WEST] = wall[:, 0] - (new_xy[:, 0] + Robot.WIDTH)
+        distances[:, SOUTH] = new_xy[:, 1] - wall[:, 3]
+        distance = distances[np.arange(len(self.xy)), AZIMUTH_DIRECTIONS[self.azimuth % 360]]
+        return ~has_wall | (distance <= 0)
+
+    def update_bug_robots(self, new_xy, wall, active):
+        """One frame of the FSMs of Robot and RobotUsingGas."""
+        just_started = active & (self.state == JUST_STARTED)
+        following_wall = active & (self.state == FOLLOWING_WALL)
+        hit_wall = wall >= 0
+        hit_robot = self.collide_robots(new_xy, active & ~hit_wall)
+        moving = active & ~hit_wall & ~hit_robot
+        not_moving_along_wall = moving & ~self.is_moving_along_wall(new_xy)
+
+        # transfer_when_colliding_wall
+        self.just_followed_wall[hit_wall] = wall[hit_wall]
+        mask = hit_wall & just_started
+        self.azimuth[mask] += 90 - self.azimuth[mask] % 90
+        self.collide_turn[mask] = TURN_LEFT
+        self.state[mask] = FOLLOWING_WALL
+        mask = hit_wall & following_wall
+        self.azimuth[mask] -= 90 * self.collide_turn[mask]
+
+        # transfer_when_colliding_another_robot
+        self.colliding_others_count += hit_robot
+        self.azimuth[hit_robot] -= 90
+        self.state[hit_robot] = JUST_STARTED
+
+        # transfer_when_not_following_wall
+        if self.uses_gas:
+            # Every moving robot marks where it was. A robot finds the places before marking,
+            # and checks the visit count of the place it has just visited after marking.
+            first_new = self.trails.cnt
+            marking = np.flatnonzero(moving)
+            self.trails.add(marking, self.replicate[marking], self.xy[marking] + Robot.radius)
+            finding = np.flatnonzero(not_moving_along_wall & following_wall)
+            found = self.trails.find(finding, self.replicate[finding], self.xy[finding] + Robot.radius, first_new)
+            revisiting = np.zeros(len(self.xy), dtype=bool)
+            revisiting[finding[found >= 0]] = True
+            self.just_visited_place[revisiting] = found[found >= 0]
+            checking = np.flatnonzero(not_moving_along_wall & just_started & (self.just_visited_place >= 0))
+            reset = self.trails.visit(finding[found >= 0], found[found >= 0],
+                                      checking, self.just_visited_place[checking])
+            mask = np.zeros(len(self.xy), dtype=bool)
+            mask[checking[reset]] = True
+            self.original_azimuth[mask] = normalize_azimuths(self.original_azimuth[mask] + 180)
+        self.commit(moving, new_xy)
+        if self.uses_gas:
+            turn_to_original = not_moving_along_wall & just_started
+            turn_according_to_wall = not_moving_along_wall & following_wall
+            self.state[revisiting] = JUST_STARTED
+        else:
+            turn_to_original = not_moving_along_wall & following_wall
+            turn_according_to_wall = not_moving_along_wall & just_started
+            self.state[turn_to_original] = JUST_STARTED
+        self.azimuth[turn_to_original] = self.original_azimuth[turn_to_original]
+        self.just_followed_wall[turn_to_original] = -1
+        self.collide_turn[turn_to_original] = TURN_NONE
+        for i in np.flatnonzero(turn_according_to_wall):
+            self.turn_according_to_wall(i)
+
+        self.azimuth = normalize_azimuths(self.azimuth)
+
+    def turn_according_to_wall(self, i):
+        """Robot.turn_according_to_wall() of the i-th robot, which is rare enough to be done one by one."""
+        rect = pygame.Rect(*self.xy[i].tolist(), Robot.WIDTH, Robot.WIDTH)
+        direction = AZIMUTH_DIRECTIONS[self.azimuth[i] % 360]
+        if direction == NORTH:
+            def get_wall_rank(w):
+                return abs(w.rect.top - rect.bottom)
+        elif direction == SOUTH:
+            def get_wall_rank(w):
+                return abs(w.rect.bottom - rect.top)
+        elif direction == WEST:
+            def get_wall_rank(w):
+                return abs(w.rect.left - rect.right)
+        else:
+            def get_wall_rank(w):
+                return abs(w.rect.right - rect.left)
+        just_followed_wall = self.arrays.walls[self.just_followed_wall[i]]
+        just_followed_wall = min(just_followed_wall.adjacent_walls, key=get_wall_rank)
+        self.just_followed_wall[i] = self.arrays.wall_indices[id(just_followed_wall)]
+        wall = just_followed_wall.rect
+        if direction == NORTH:
+            self.azimuth[i] += -90 if wall.left > rect.right else 90
+        elif direction == SOUTH:
+            self.azimuth[i] += 90 if wall.left > rect.right else -90
+        elif direction == WEST:
+            self.azimuth[i] += 90 if wall.top > rect.bottom else -90
+        else:
+            self.azimuth[i] += -90 if wall.top > rect.bottom else 90
+
+    def update_random_robots(self, new_xy, hit_wall, active):
+        """
+        One frame of the FSM of RandomRobot. The robots draw from random in robot order, once if colliding and
+        once or twice otherwise, and whether a robot collides depends on whether the robots before it have moved.
+        So the words are drawn at once by RandomDraws, and only where the draws of each robot start is followed
+        robot by robot.
+        """
+        gathering = active & (self.state == GATHERING)
+        found_injury = active & (self.state == FOUND_INJURY)
+        finished_gathering = np.zeros(len(self.xy), dtype=bool)
+        leaving = np.zeros(len(self.xy), dtype=bool)
+        if gathering.any() or found_injury.any():
+            departure = self.arrays.departure_position
+            new_diff = new_xy + Robot.radius - departure
+            finished_gathering = gathering & (
+                (np.einsum("ij,ij->i", new_diff, new_diff) <= (Robot.radius + self.arrays.departure_radius) ** 2) |
+                (np.hypot(*(self.position - departure).T) < GatherableRobot.GATHER_THRESH))
+            leaving = found_injury & (np.hypot(*(self.position - departure).T) > GatherableRobot.GATHER_THRESH)
+        checking = active & ~finished_gathering & ~hit_wall
+        drawing = active & ~finished_gathering & ~found_injury
+        hit_robot, i, j, at_new_xy = self.get_collisions(new_xy, checking, finished_gathering, checking & ~leaving)
+        # Robots with pairs are settled in the loop, the others here.
+        undecided = np.zeros(len(self.xy), dtype=bool)
+        undecided[i] = True
+        moving = finished_gathering | (found_injury & ~hit_wall & ~hit_robot & ~leaving & ~undecided)
+        robots = np.flatnonzero(drawing | undecided)
+        order = np.argsort(i, kind="stable")
+        starts = np.searchsorted(i[order], np.arange(len(self.xy) + 1)).tolist()
+        j, at_new_xy = j[order].tolist(), at_new_xy[order].tolist()
+        robots = robots.tolist()
+        hit = (hit_wall | hit_robot).tolist()
+        drawing, leaving = drawing.tolist(), leaving.tolist()
+        cnt = 4 * len(robots) + 64  # far more than the draws of the robots need
+        while True:
+            draws = RandomDraws(self.random, cnt)
+            next_azimuth, next_choice, choices = draws.next_azimuth, draws.next_choice, draws.choices
+            robot_moving = moving.tolist()
+            hit_others = []
+            azimuth_robots = []
+            azimuth_words = []
+            start = 0
+            for robot in robots:
+                for pair in range(starts[robot], starts[robot + 1]):
+                    if at_new_xy[pair] == robot_moving[j[pair]]:
+                        hit_others.append(robot)
+                        break
+                else:
+                    if not hit[robot]:
+                        if not drawing[robot]:  # found_injury
+                            robot_moving[robot] = not leaving[robot]
+                            continue
+                        word = next_choice[start]
+                        start = word + 1
+                        if choices[word]:  # choosing robot.commit_go_front over robot.turn_to_azimuth
+                            robot_moving[robot] = True
+                            continue
+                if drawing[robot]:
+                    word = next_azimuth[start]
+                    start = word + 1
+                    azimuth_robots.append(robot)
+                    azimuth_words.append(word)
+            if start <= cnt:
+                break
+            draws.consume(0)
+            cnt *= 2
+        draws.consume(start)
+
+        hit_robot[hit_others] = True
+        self.colliding_others_count += hit_robot
+        self.commit(np.array(robot_moving), new_xy)
+        self.mission_complete |= finished_gathering
+        self.state[finished_gathering] = FOUND_INJURY
+        self.azimuth[azimuth_robots] = draws.azimuths[azimuth_words]
+
+    def update_areas(self, active):
+        """Visits rooms and rescues injuries entered, like the end of Robot.update()."""
+        areas, entered = self.arrays.collide_areas(self.xy, Robot.WIDTH)
+        self.in_room = np.where(active, entered.any(axis=1), self.in_room)
+        fresh = active[:, None] & entered & ~self.area_done[self.replicate[:, None], areas]
+        for i in np.flatnonzero(fresh.any(axis=1)):  # in robot order, so the first robot gets the credit
+            replicate = self.replicate[i]
+            for area in np.unique(areas[i][fresh[i]]).tolist():
+                if self.area_done[replicate, area]:
+                    continue
+                self.area_done[replicate, area] = True
+                if area <= self.arrays.room_cnt:
+                    self.visit_room_count[i] += 1
+                    self.visited_room_counts[replicate] += 1
+                else:
+                    self.rescue_count[i] += 1
+                    self.rescued_injury_counts[replicate] += 1
+                self.visit_area(replicate, area)
+
+    def visit_area(self, replicate, area):
+        """Called when an area is visited or rescued for the first time in the replicate."""
+        pass
+
+    def get_replicate_mask(self, replicates):
+        """Robots of the replicates, which are given like NumPy indices, or all if None."""
+        if replicates is None:
+            return np.ones(len(self.replicate), dtype=bool)
+        mask = np.zeros(self.replicates, dtype=bool)
+        mask[replicates] = True
+        return mask[self.replicate]
+
+    def enter_gathering_mode(self, replicates=None):
+        replicates = slice(None) if replicates is None else replicates
+        self.first_injury_action_counts[replicates] = self.action_counts[replicates]
+        if self.is_random:  # only GatherableRobot can gather
+            mask = self.get_replicate_mask(replicates)
+            self.position[mask] = self.xy[mask] + Robot.radius
+            self.state[mask] = GATHERING
+            self.collide_turn[mask] = TURN_NONE
+
+    @property
+    def layout_done(self):
+        """Whether each replicate has visited all rooms and rescued all injuries, like bool(Layout)."""
+        return (self.visited_room_counts == self.arrays.room_cnt) & \
+            (self.rescued_injury_counts == len(self.arrays.areas) - 1 - self.arrays.room_cnt)
+
+    @property
+    def missions_complete(self):
+        """Whether all robots of each replicate are mission_completed."""
+        return self.mission_complete.reshape(self.replicates, self.amount).all(axis=1)
+
+    def report_layout(self, replicate=0):
+        """Layout.report() of the replicate."""
+        rescued_injury_cnt = int(self.rescued_injury_counts[replicate])
+        return int(self.visited_room_counts[replicate]) + rescued_injury_cnt, rescued_injury_cnt
+
+    def report_macro_states(self, replicate=0):
+        state = self.state[self.replicate == replicate]
+        just_started_cnt = int(np.count_nonzero(state == JUST_STARTED))
+        following_wall_cnt = int(np.count_nonzero(state == FOLLOWING_WALL))
+        last_just_start_cnt = int(self.last_just_start_counts[replicate])
+        last_following_wall_cnt = int(self.last_following_wall_counts[replicate])
+        self.last_just_start_counts[replicate] = just_started_cnt
+        self.last_following_wall_counts[replicate] = following_wall_cnt
+        return int(self.action_counts[replicate]), just_started_cnt, following_wall_cnt, \
+            just_started_cnt - last_just_start_cnt, following_wall_cnt - last_following_wall_cnt
+
+    def report_search(self, replicate=0):
+        robots = self.replicate == replicate
+        report = np.stack((self.visit_room_count[robots] + self.rescue_count[robots], self.rescue_count[robots],
+                           self.colliding_others_count[robots]), axis=1)
+        return [int(self.action_counts[replicate] - self.first_injury_action_counts[replicate])] + \
+            report.ravel().tolist()
+
+    def report_gather(self, replicate=0):
+        return int(np.count_nonzero(self.mission_complete[self.replicate == replicate]))
+
+    def __len__(self):
+        return len(self.replicate)
+
+    def __str__(self):
+        return f"{self.__class__.__name__}({self.robot_type.__name__} * {self.amount} * {self.replicates})"
+
+
+class VectorizedRobotManager(EnsembleRobotManager):
+    """
+    EnsembleRobotManager of a single swarm, which can be used in place of the sprite managers.
+    Visited rooms and rescued injuries are updated in the layout as well.
+    """
+
+    def __init__(self, robot_type, logger, background, amount, *,
+                 depart_from_edge=False, act_after_finding_injury=False, seed=None):
+        super().__init__(robot_type, logger, background, amount, depart_from_edge=depart_from_edge,
+                         act_after_finding_injury=act_after_finding_injury, seed=seed)
+
+    @property
+    def action_count(self):
+        return int(self.action_counts[0])
+
+    @property
+    def first_injury_action_count(self):
+        return int(self.first_injury_action_counts[0])
+
+    def visit_area(self, replicate, area):
+        self.arrays.areas[area].update()
+
+    def __str__(self):
+        return f"{self.__class__.__name__}({self.robot_type.__name__} * {self.amount})"
+
+    def __bool__(self):
+        """All robots are mission_completed."""
+        return bool(self.mission_complete.all())